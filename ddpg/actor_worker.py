@@ -0,0 +1,81 @@
+import queue
+import numpy as np
+from .numpy_actor import NumpyActor
+from util.noise_stream import NormalStream
+from env.vector_scenery import VectorScenery
+
+
+# Actor side of the distributed trainer (ddpg/distributed.py). It only needs
+# NumPy, so worker processes never import TensorFlow.
+
+def actor_noise_sigmas(num_actors, base=0.4, alpha=7.0):
+    # Ape-X style spread: actor i explores with base^(1 + alpha * i / (K - 1)),
+    # from strongly exploring to almost greedy.
+    if num_actors == 1:
+        return [base]
+    return [base ** (1 + alpha * i / (num_actors - 1)) for i in range(num_actors)]
+
+
+def run_actor(
+        index, transitions, weights, stop, sigma, seed,
+        num_envs, max_steps, dt, chunk_steps
+):
+    noise = NormalStream(seed)
+    scenery = VectorScenery(num_envs, max_steps)
+    actor = NumpyActor.from_layers(weights.get())
+
+    states = scenery.get_current_state()
+    episode_rewards = np.zeros(num_envs)
+    episode_steps = np.zeros(num_envs, dtype=np.int64)
+
+    buffers = {
+        "states": np.zeros((chunk_steps, num_envs, 4), dtype=np.float32),
+        "actions": np.zeros((chunk_steps, num_envs, 1), dtype=np.float32),
+        "rewards": np.zeros((chunk_steps, num_envs), dtype=np.float32),
+        "next_states": np.zeros((chunk_steps, num_envs, 4), dtype=np.float32),
+        "dones": np.zeros((chunk_steps, num_envs), dtype=np.float32),
+    }
+
+    while not stop.is_set():
+        finished = []
+        for step in range(chunk_steps):
+            # Pick up the most recent weights broadcast by the learner.
+            try:
+                actor.set_layers(weights.get_nowait())
+            except queue.Empty:
+                pass
+
+            actions = np.clip(actor(states), -1, 1)
+            actions = np.clip(actions + sigma * noise.take(actions.shape), -1, 1)
+
+            scenery._apply_action(actions[:, 0])
+            scenery.tick(dt)
+            next_states, rewards, terminated, truncated = scenery.post_tick()
+
+            buffers["states"][step] = states
+            buffers["actions"][step] = actions
+            buffers["rewards"][step] = rewards
+            buffers["next_states"][step] = next_states
+            buffers["dones"][step] = terminated
+
+            episode_rewards += rewards
+            episode_steps += 1
+            for i in np.flatnonzero(terminated):
+                finished.append((index, episode_rewards[i], int(episode_steps[i])))
+            episode_rewards[terminated] = 0.0
+            episode_steps[terminated] = 0
+
+            states = scenery.get_current_state()
+
+        chunk = {name: array.reshape((-1,) + array.shape[2:]).copy() for name, array in buffers.items()}
+        chunk["episodes"] = finished
+
+        # Block while the learner is behind, but keep watching for shutdown.
+        while not stop.is_set():
+            try:
+                transitions.put(chunk, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+
+    transitions.cancel_join_thread()
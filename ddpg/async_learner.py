@@ -0,0 +1,91 @@
+import time
+import threading
+import traceback
+
+
+class AsyncLearner:
+    # Trains the agent from a background thread for as long as it runs, so the
+    # acting loop no longer waits for a gradient step after every env step.
+    # The agent should act with its NumPy actor: DDPG.train re-syncs it every
+    # numpy_actor_refresh actor updates, which is how weights are published.
+    #
+    # Left alone, the acting loop holds the GIL nearly all the time and the
+    # learner barely trains. With max_steps_per_update, acted() blocks the
+    # acting loop while it is more than that many env steps per update ahead
+    # of the learner (steps taken before the memory holds enough samples to
+    # train do not count). A failure in the learner thread is raised again
+    # from acted() and stop().
+    def __init__(self, agent, idle_sleep=0.001, max_steps_per_update=None):
+        assert max_steps_per_update is None or max_steps_per_update > 0
+
+        self._agent = agent
+        self._idle_sleep = idle_sleep
+        self._max_steps_per_update = max_steps_per_update
+        self._stop = threading.Event()
+        self._progress = threading.Condition()
+        self._thread = None
+        self._error = None
+        self._start_time = 0.0
+        self._stop_time = None
+        self.updates = 0
+        self.steps = 0
+
+    def start(self):
+        assert self._thread is None
+        self._start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                updates = self._agent.train()
+                if updates:
+                    with self._progress:
+                        self.updates += updates
+                        self._progress.notify_all()
+                else:
+                    # Not enough samples in the memory yet.
+                    time.sleep(self._idle_sleep)
+        except Exception as error:
+            print("~~~~~ Asynchronous learner failed")
+            traceback.print_exc()
+            with self._progress:
+                self._error = error
+                self._progress.notify_all()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError("Asynchronous learner failed") from self._error
+
+    def acted(self):
+        # Called by the acting loop after every env step.
+        self._raise_error()
+        if not self._agent.can_train():
+            return
+        self.steps += 1
+        if self._max_steps_per_update is None:
+            return
+        with self._progress:
+            while (
+                    self.updates * self._max_steps_per_update < self.steps
+                    and self._error is None and not self._stop.is_set()
+            ):
+                self._progress.wait(0.1)
+        self._raise_error()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        with self._progress:
+            self._progress.notify_all()
+        self._thread.join()
+        self._thread = None
+        self._stop_time = time.perf_counter()
+        self._raise_error()
+
+    def updates_per_second(self):
+        end = self._stop_time if self._stop_time is not None else time.perf_counter()
+        elapsed = end - self._start_time
+        return self.updates / elapsed if elapsed > 0 else 0.0
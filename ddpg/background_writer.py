@@ -0,0 +1,60 @@
+import os
+import csv
+import queue
+import threading
+import traceback
+
+
+class BackgroundWriter:
+    # Runs file writes (checkpoints, metric rows) on a thread so the training
+    # loop only pays for taking a snapshot. Jobs wait in a bounded queue:
+    # when the disk falls behind, submit() blocks instead of piling up
+    # snapshots in memory.
+    def __init__(self, max_pending=8):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self.written = 0
+        self.failed = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                (write, args) = job
+                write(*args)
+                self.written += 1
+            except Exception:
+                # A failed write must not take the training run down with it.
+                self.failed += 1
+                print("~~~~~ Background write failed")
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+    def submit(self, write, *args):
+        self._queue.put((write, args))
+
+    def flush(self):
+        self._queue.join()
+
+    def stop(self):
+        # Writes everything still queued before returning.
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+
+def append_row(filename, row):
+    # Appends a dict as a CSV row, writing the header when the file is new.
+    new = not os.path.isfile(filename)
+    with open(filename, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(row))
+        if new:
+            writer.writeheader()
+        writer.writerow(row)
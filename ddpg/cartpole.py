@@ -1,24 +1,42 @@
-import pygame
+import signal
 import numpy as np
-import time
-from tkinter import filedialog, Tk
-from .ddpg import DDPG
-from env.scenery import Scenery
-from util.flags import TRACE, RECORD, SAVE_NEW_WEIGHTS, PREFILL_MEMORY
+from .trainer import Trainer, MAX_STEPS, EPISODES, MEMORY_SIZE, SIM_DT
+from .early_stopping import REWARD_THRESHOLD
+from util.flags import TRACE, RECORD, SAVE_NEW_WEIGHTS, PREFILL_MEMORY, HEADLESS, REALTIME
 
 
 # ~  Constants
-MAX_STEPS = 500
-EPISODES = 2000
-MEMORY_SIZE = 65536
 WINDOW_DIM = (1000, 300)
+MEMORY_PATH = None    # directory of a persistent replay memory, e.g. "cartpole-memory"
+CHECKPOINT_PATH = None    # directory of resumable checkpoints, e.g. "cartpole-checkpoints"
+CHECKPOINT_INTERVAL = 100    # episodes between checkpoints
+CHECKPOINT_KEEP = 3    # number of most recent checkpoints kept
+METRICS_PATH = None    # CSV file with one row per episode, e.g. "cartpole-metrics.csv"
+STOP_REWARD = REWARD_THRESHOLD    # rolling reward that ends the run once held; None trains all EPISODES
+STOP_WINDOW = 100    # episodes in the rolling reward
+STOP_PATIENCE = 200    # episodes the rolling reward has to hold STOP_REWARD
+STALL_PATIENCE = 500    # episodes without a new best rolling reward before giving up; None never
 
 
 # -------------------------------------------------------------------------------- #
 
 # ~ Util Functions
 
-def handle_recording():
+# pygame and tkinter are imported by the functions that use them, so a
+# headless run never loads them and a windowed one loads tkinter only when a
+# file has to be picked.
+
+def ask_filename():
+    from tkinter import filedialog, Tk
+    root = Tk()
+    root.withdraw()
+    filename = filedialog.askopenfilename()
+    root.destroy()
+    return filename
+
+
+def handle_recording(scenery, surface, font):
+    import pygame
     for event in pygame.event.get():
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_r:
@@ -30,9 +48,9 @@ def handle_recording():
                 if scenery.is_playing():
                     scenery.stop_playing()
                 else:
-                    scenery.start_playing(filedialog.askopenfilename())
+                    scenery.start_playing(ask_filename())
             elif event.key == pygame.K_c:
-                filename = filedialog.askopenfilename()
+                filename = ask_filename()
                 if filename != "":
                     surface.fill((0, 0, 0))
                     msg = "Converting video ..."
@@ -47,13 +65,12 @@ def handle_recording():
                     scenery.convert_recording(filename)
 
 
-def init_simulator(clock, surface, font):
-    clock = pygame.time.Clock()
+def init_simulator():
+    import pygame
+    pygame.init()
     pygame.display.set_caption("Cart-pole simulator")
     surface = pygame.display.set_mode(WINDOW_DIM)
 
-    Tk().withdraw()
-
     if pygame.font.match_font("Monospace", True):
         font = pygame.font.SysFont("Monospace", 20, True)
     elif pygame.font.match_font("Courier New", True):
@@ -61,241 +78,139 @@ def init_simulator(clock, surface, font):
     else:
         font = pygame.font.Font(None, 20)
 
-    return clock, surface, font
-
-
-def fill_memory(memory_size, scenery, agent, clock):
-    i = 0
-    j = 0
-    print("~~~~~ Filling memory")
-    while (len(agent._memory) < memory_size):
-        pygame.event.pump()
-        dt = clock.get_time()
-        action = agent.action(state, i)
-        scenery._action += action[0]
-        scenery.tick(dt / 1000.0, j)
-        x, y, terminated = scenery.post_tick(j, action)
-        agent.feed(action, y, x)
-
-        j += 1
-        if terminated:
-            i += 1
-            j = 0
-            scenery.reset()
-            x = scenery.get_current_state()
-
-        clock.tick(50)
-
-    scenery.reset()
-    print(f"~~~~~ Memory filled: {len(agent._memory)}")
-
-    return scenery, agent
-
-
-# -------------------------------------------------------------------------------- #
-
-# ~  Simulator
-
-pygame.init()
-
-if PREFILL_MEMORY:
-    clock = None
-    surface = None
-    font = None
-else:
-    clock = pygame.time.Clock()
-    pygame.display.set_caption("Cart-pole simulator")
-    surface = pygame.display.set_mode(WINDOW_DIM)
+    return surface, font
 
-    Tk().withdraw()
 
-    if pygame.font.match_font("Monospace", True):
-        font = pygame.font.SysFont("Monospace", 20, True)
-    elif pygame.font.match_font("Courier New", True):
-        font = pygame.font.SysFont("Courier New", 20, True)
-    else:
-        font = pygame.font.Font(None, 20)
+def window_hook(surface, font):
+    import pygame
 
-sum_dt = 0
-fps = 0
-sum_fps = 0
-frame_count = 0
-avg_fps = 0
+    def draw_frame(trainer, action, reward, terminated):
+        scenery = trainer.scenery
+        pygame.event.pump()
+        scenery.draw()
+
+        # text = font.render("Max reward: %.1f" % np.max(trainer.metrics["rewards"]), True, (255, 255, 255))
+        # surface.blit(text, (775, 5))
+        text = font.render("Episode: %d" % trainer.episode, True, (255, 255, 255))
+        surface.blit(text, (5, 5))
+        text_y = 5
+        if pygame.time.get_ticks() % 1000 <= 500:
+            msg = ""
+            color = (255, 255, 255)
+            if scenery.is_recording():
+                msg = "RECORDING"
+                color = (255, 64, 64)
+            elif scenery.is_playing():
+                msg = "PLAYING"
+                color = (64, 255, 64)
+            (width, height) = font.size(msg)
+            text = font.render(msg, True, color)
+            surface.blit(text, (surface.get_width() - width - 5, text_y))
+            text_y += height
+
+        pygame.display.update()
+
+        if RECORD:
+            handle_recording(scenery, surface, font)
+
+    return draw_frame
 
 
 # -------------------------------------------------------------------------------- #
 
 # ~  Algorithm
 
-def new_ddpg():
-    return DDPG(
-        num_inputs=4,
-        num_outputs=1,
+def new_trainer(surface=None):
+    return Trainer(
+        max_steps=MAX_STEPS,
+        episodes=EPISODES,
+        memory_size=MEMORY_SIZE,
         seed=1,
         tau=0.01,
         gamma=0.97,
         batch_size=256,
-        memory_size=MEMORY_SIZE,
         noise_decay=EPISODES,
         my_ou=0,    # 0 - Gauss, 1 - My OU, 2 - tf-agents OU
         actor_layers=[128, 32],
         critic_layers=[128, 32],
         actor_lr=0.0002,
-        critic_lr=0.0003
+        critic_lr=0.0003,
+        repetitions=1,
+        sim_dt=SIM_DT,
+        realtime=REALTIME and not HEADLESS,
+        surface=surface,
+        memory_path=MEMORY_PATH,
+        prioritized=False,
+        eager=False,        # run the update step eagerly for debugging
+        jit_compile=False,  # compile the update step with XLA
+        numpy_actor=False,  # select actions with a NumPy copy of the actor
+        numpy_actor_refresh=1,
+        async_learner=False,  # train in a background thread while acting
+        publish_interval=100, # actor updates between weight publications
+        max_steps_per_update=4,  # async only: env steps allowed per learner update
+        updates_per_step=1,   # gradient updates per env step, may be fractional
+        target_update_interval=1, # actor updates between soft target updates
+        checkpoint_path=CHECKPOINT_PATH,  # written in the background
+        checkpoint_interval=CHECKPOINT_INTERVAL,
+        checkpoint_keep=CHECKPOINT_KEEP,
+        metrics_path=METRICS_PATH,
+        stop_reward=STOP_REWARD,
+        stop_window=STOP_WINDOW,
+        stop_patience=STOP_PATIENCE,
+        stall_patience=STALL_PATIENCE
     )
 
 
-run = True
-episodes_count = 0
-episode_steps = 0
-repetitions = 1
-n = 0
-
-# Metrics
-ep_reward = 0
-rewards_episodes = np.zeros(EPISODES)
-rewards_avg_step = rewards_episodes
-pos_avg_episodes = rewards_episodes
-ep_pos = 0
-angle_avg_episodes = rewards_episodes
-ep_angle = 0
-
-
-# ~  Agent
-
-agent = new_ddpg()
-
-# ~  Fill memory before training
-
-if PREFILL_MEMORY:
-    clock, surface, font = init_simulator(clock, surface, font)
-    scenery = Scenery(MAX_STEPS, surface)
-    scenery.reset()
-    state = scenery.get_current_state()
-
-    scenery, agent = fill_memory(MEMORY_SIZE, scenery, agent, clock)
-    print(f"~~~~~ Resetting environment for training with full memory")
+def main():
+    surface = None
+    font = None
+    if not HEADLESS:
+        surface, font = init_simulator()
 
-# ~ Set up for training
+    trainer = new_trainer(surface)
+    if not HEADLESS:
+        trainer.add_step_hook(window_hook(surface, font))
 
-scenery = Scenery(MAX_STEPS, surface)
-scenery.reset()
-state = scenery.get_current_state()
-if TRACE:
-    print(f"~~~~~ Initial state: {state}")
+    # ~  Fill memory before training
+    if PREFILL_MEMORY:
+        trainer.fill_memory()
+        print(f"~~~~~ Resetting environment for training with full memory")
 
-if agent.load_weights("cartpole-model"):
-    print("~~~~~ Weights loaded")
+    if TRACE:
+        print(f"~~~~~ Initial state: {trainer.state}")
 
+    if CHECKPOINT_PATH is not None and trainer.load_checkpoint(CHECKPOINT_PATH):
+        print(f"~~~~~ Resumed from checkpoint at episode {trainer.episode}")
+    elif trainer.load_weights("cartpole-model"):
+        print("~~~~~ Weights loaded")
 
-# -------------------------------------------------------------------------------- #
+    if CHECKPOINT_PATH is not None:
+        # Preemption usually arrives as SIGTERM: stop after the current step;
+        # the run ends with a checkpoint instead of losing its progress.
+        signal.signal(signal.SIGTERM, lambda *args: trainer.stop())
 
-# ~  Main Loop
-
-while run:
-    pygame.event.pump()
-
-    dt = clock.get_time()
-    frame_count += 1
-    sum_dt += dt
-    if dt > 0:
-        fps = 1000.0 / dt
-    sum_fps += fps
-    if sum_dt >= 100:
-        avg_fps = sum_fps / frame_count
-        sum_fps = 0
-        frame_count = 0
-        sum_dt = 0
-
-    # ~  Main algorithm
-    action = agent.action(state, episodes_count)
-
-    scenery._apply_action(action[0])
-    scenery.tick(dt / 1000.0, episode_steps)
-    state, step_reward, terminated = scenery.post_tick(episode_steps, action)
-
-    agent.feed(action, step_reward, state)
-    agent.train()
-
-    ep_reward += step_reward
-    ep_pos += state[0]
-    ep_angle += state[2]
-    episode_steps += 1
-
-    scenery.draw()
-
-    if terminated:
-        rewards_episodes[episodes_count] += ep_reward
-        rewards_avg_step[episodes_count] += ep_reward / episode_steps
-        pos_avg_episodes[episodes_count] += ep_pos / episode_steps
-        angle_avg_episodes[episodes_count] += ep_angle / episode_steps
-
-        episodes_count += 1
-        # agent.episode_counter = episodes_count
-        episode_steps = 0
-        ep_reward = 0
-        ep_pos = 0
-        ep_angle = 0
-
-        scenery.reset()
-        state = scenery.get_current_state()
-
-        if episodes_count >= EPISODES:
-            n += 1
-            if n >= repetitions:
-                break
-
-            print(f"~~~~~ Repetition {n}")
-            agent = new_ddpg()
-            episodes_count = 0
-
-    # text = font.render("Max reward: %.1f" % np.max(rewards_episodes), True, (255, 255, 255))
-    # surface.blit(text, (775, 5))
-    # text = font.render("Ep. reward: %.1f" % rewards_episodes[episodes_count - 1], True, (255, 255, 255))
-    # surface.blit(text, (5, 25))
-    text = font.render("Episode: %d" % episodes_count, True, (255, 255, 255))
-    surface.blit(text, (5, 5))
-    text_y = 5
-    if pygame.time.get_ticks() % 1000 <= 500:
-        msg = ""
-        color = (255, 255, 255)
-        if scenery.is_recording():
-            msg = "RECORDING"
-            color = (255, 64, 64)
-        elif scenery.is_playing():
-            msg = "PLAYING"
-            color = (64, 255, 64)
-        (width, height) = font.size(msg)
-        text = font.render(msg, True, color)
-        surface.blit(text, (surface.get_width() - width - 5, text_y))
-        text_y += height
-
-    pygame.display.update()
-
-    if RECORD:
-        handle_recording()
+    # ~  Main Loop
+    metrics = trainer.run()
 
-    if TRACE:
-        print(f"~~~~~ Action to apply   : {action}")
-        print(f"~~~~~ Episode reward    : {ep_reward}")
-        print(f"~~~~~ Action post apply : {scenery._action}")
-        print(f"~~~~~ State after tick  : {state}")
+    if not HEADLESS:
+        import pygame
+        pygame.quit()
 
-    clock.tick(50)
-    time.sleep(0.02)
+    # print("~~~~~ DONE ~~~~~")
+    # print("~~~~~ Rewards per episode")
+    # print("~~~~~ Start of results:")
+    # for i in range(EPISODES):
+    #     print(metrics["rewards"][i])
+    # print("~~~~~ End of results.")
 
-pygame.quit()
+    # Only the episodes that ran: early stopping may end the run before EPISODES.
+    np.save("reward_step.npy", metrics["reward_step"][:trainer.episode])
+    np.save("pos_avg.npy", metrics["pos_avg"][:trainer.episode])
+    np.save("angle_avg.npy", metrics["angle_avg"][:trainer.episode])
 
-# print("~~~~~ DONE ~~~~~")
-# print("~~~~~ Rewards per episode")
-# print("~~~~~ Start of results:")
-# for i in range(EPISODES):
-#     print(rewards_episodes[i])
-# print("~~~~~ End of results.")
+    if SAVE_NEW_WEIGHTS:
+        trainer.save_weights("cartpole-model")
 
-np.save("reward_step.npy", rewards_avg_step)
-np.save("pos_avg.npy", pos_avg_episodes)
-np.save("angle_avg.npy", angle_avg_episodes)
 
-if SAVE_NEW_WEIGHTS:
-    agent.save_weights("cartpole-model")
+if __name__ == "__main__":
+    main()
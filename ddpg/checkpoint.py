@@ -0,0 +1,107 @@
+import os
+import re
+import json
+import shutil
+import numpy as np
+
+
+# A checkpoint is a directory. It is written next to its final place and
+# swapped in with renames, so an interrupted save never leaves a half-written
+# checkpoint behind: either the new or the previous one survives.
+
+def write(path, save):
+    # save(directory) writes the checkpoint contents into directory.
+    path = os.path.normpath(path)
+    tmp = path + ".tmp"
+    old = path + ".old"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    save(tmp)
+
+    if os.path.isdir(path):
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def find(path):
+    # path is a checkpoint or a directory of numbered ones, in which case the
+    # latest is used. A crash between the two renames in write() leaves only
+    # the old copy.
+    path = os.path.normpath(path)
+    for candidate in (path, path + ".old"):
+        if os.path.isfile(os.path.join(candidate, "agent.json")):
+            return candidate
+    return latest(path)
+
+
+# Periodic checkpoints go to numbered directories under one directory, of
+# which only the newest `keep` are kept.
+
+PREFIX = "checkpoint-"
+
+
+def numbered(directory):
+    # Complete numbered checkpoints, oldest first.
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory) if re.fullmatch(PREFIX + r"\d+", name))
+    return [os.path.join(directory, name) for name in names]
+
+
+def latest(directory):
+    paths = numbered(directory)
+    return paths[-1] if paths else None
+
+
+def write_numbered(directory, number, save, keep=None):
+    os.makedirs(directory, exist_ok=True)
+    write(os.path.join(directory, f"{PREFIX}{number:08d}"), save)
+    if keep is not None:
+        for path in numbered(directory)[:-keep]:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# A state is a dict, possibly nested, of NumPy arrays and JSON values. The
+# arrays are stored in <name>.npz without pickling and everything else in
+# <name>.json, both keyed by the dotted path of the value.
+
+def flatten(state, prefix=""):
+    flat = {}
+    for key, value in state.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + "."))
+        elif isinstance(value, np.generic):
+            flat[prefix + key] = value.item()
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def unflatten(flat):
+    state = {}
+    for key, value in flat.items():
+        *parents, name = key.split(".")
+        node = state
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[name] = value
+    return state
+
+
+def save_state(directory, name, state):
+    flat = flatten(state)
+    arrays = {key: value for key, value in flat.items() if isinstance(value, np.ndarray)}
+    values = {key: value for key, value in flat.items() if not isinstance(value, np.ndarray)}
+    np.savez(os.path.join(directory, name + ".npz"), **arrays)
+    with open(os.path.join(directory, name + ".json"), "w") as f:
+        json.dump(values, f)
+
+
+def load_state(directory, name):
+    with np.load(os.path.join(directory, name + ".npz"), allow_pickle=False) as arrays:
+        flat = {key: arrays[key] for key in arrays.files}
+    with open(os.path.join(directory, name + ".json")) as f:
+        flat.update(json.load(f))
+    return unflatten(flat)
@@ -1,12 +1,15 @@
-import random
+import os
+import threading
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras.models import Sequential, clone_model
 from tensorflow.keras.layers import Dense, Activation
 from tensorflow.keras.optimizers import Adam
-from tf_agents.utils import common
 from util.ornstein_uhlenbeck import OUNoise
 from util.gaussian import GaussianNoise
+from . import checkpoint
+from .numpy_actor import NumpyActor
+from .replay_buffer import ReplayBuffer, MemmapReplayBuffer, PrioritizedReplayBuffer
 
 
 class DDPG:
@@ -15,7 +18,11 @@ class DDPG:
             tau, gamma, batch_size, memory_size,
             noise_decay, my_ou,
             actor_layers, critic_layers,
-            actor_lr, critic_lr
+            actor_lr, critic_lr,
+            memory_path=None, memory_read_only=False, prioritized=False,
+            eager=False, jit_compile=False,
+            numpy_actor=False, numpy_actor_refresh=1, num_envs=1,
+            updates_per_step=1, target_update_interval=1
     ):
         assert num_inputs > 0
         assert num_outputs > 0
@@ -26,23 +33,41 @@ class DDPG:
         assert batch_size is not None
         assert len(actor_layers) > 0
         assert len(critic_layers) > 0
+        assert not (prioritized and memory_path is not None)
+        assert numpy_actor_refresh > 0
+        assert num_envs > 0
+        assert updates_per_step > 0
+        assert target_update_interval > 0
 
         self._tau = tau
+        self._noise_decay = noise_decay
         self._gamma = gamma
         self._batch_size = batch_size
         self._memory_size = memory_size
+        self._uniform_weight_cache = {}
+        self._updates_per_step = updates_per_step
+        self._update_credit = 0.0
         self._episode_counter = 0
+        self._prioritized = prioritized
+        self._my_ou = my_ou
+        self._num_envs = num_envs
 
         tf.random.set_seed(seed)
         np.random.seed(seed)
 
+        # The OU processes keep one state per environment. The NumPy noise
+        # draws from its own generator, independent of the global np.random.
         if my_ou == 0:
-            self.gauss = GaussianNoise(num_outputs, (3 * noise_decay)/4)
+            self.gauss = GaussianNoise(num_outputs, (3 * noise_decay)/4, seed=seed)
         elif my_ou == 1:
-            self.myOUNoise = OUNoise(action_space_size=1, decay_period=noise_decay)
+            self.myOUNoise = OUNoise(
+                    action_space_size=num_outputs, decay_period=noise_decay, num_envs=num_envs, seed=seed
+                    )
         elif my_ou == 2:
+            # tf-agents takes seconds to import and is only needed here.
+            from tf_agents.utils import common
             self.OU = common.ornstein_uhlenbeck_process(
-                    initial_value=0.0,
+                    initial_value=np.zeros((num_envs, num_outputs), dtype=np.float32),
                     damping=0.15,
                     stddev=0.2,
                     seed=np.random.normal(),
@@ -74,63 +99,183 @@ class DDPG:
         self.target_actor = clone_model(self.actor)
         self.target_critic = clone_model(self.critic)
 
+        # (target, online) variable pairs of both networks, soft updated
+        # together. Every target_update_interval actor updates the targets move
+        # with 1 - (1 - tau)^interval, which keeps the same averaging horizon.
+        # A variable, so that set_hyperparameters does not retrace the update.
+        self._target_pairs = list(zip(
+            self.target_actor.trainable_variables + self.target_critic.trainable_variables,
+            self.actor.trainable_variables + self.critic.trainable_variables
+        ))
+        self._target_update_interval = target_update_interval
+        self._target_tau = tf.Variable(1 - (1 - tau) ** target_update_interval, dtype=tf.float32, trainable=False)
+        self._target_counter = tf.Variable(0, dtype=tf.int64, trainable=False)
+
         # Construct the optimizers.
         self.actor_optimizer = Adam(learning_rate=actor_lr)
         self.critic_optimizer = Adam(learning_rate=critic_lr)
 
-        # Initialize the replay memory.
-        self._memory = []
-        self._memory_index = 0
-        self._previous_state = []
+        # Optional NumPy copy of the actor for fast single-state inference,
+        # re-synced every numpy_actor_refresh actor updates.
+        self._numpy_actor = NumpyActor(self.actor) if numpy_actor else None
+        self._numpy_actor_refresh = numpy_actor_refresh
+        self._actor_updates = 0
+
+        # Optimizer state has to exist before the update is traced into a graph.
+        if hasattr(self.actor_optimizer, "build"):
+            self.actor_optimizer.build(self.actor.trainable_variables)
+            self.critic_optimizer.build(self.critic.trainable_variables)
+
+        # Compile the whole update (critic, actor and soft target update) into
+        # one graph, optionally with XLA. Eager mode is kept for debugging.
+        if eager:
+            self._train_step = self._update
+            self._train_steps = self._update_many
+            self._soft_update_step = self._soft_update
+        else:
+            self._train_step = tf.function(self._update, jit_compile=jit_compile)
+            self._train_steps = tf.function(self._update_many, jit_compile=jit_compile)
+            self._soft_update_step = tf.function(self._soft_update, jit_compile=jit_compile)
+
+        # Initialize the replay memory, on disk if a path is given.
+        if prioritized:
+            self._memory = PrioritizedReplayBuffer(memory_size, num_inputs, num_outputs)
+        elif memory_path is None:
+            self._memory = ReplayBuffer(memory_size, num_inputs, num_outputs)
+        else:
+            self._memory = MemmapReplayBuffer(
+                memory_path, memory_size, num_inputs, num_outputs, memory_read_only
+            )
+        self._previous_state = None
+        # Guards the memory when an AsyncLearner trains from another thread.
+        self._memory_lock = threading.Lock()
 
     def action(self, state, ep_count):
-        action = self.actor(tf.convert_to_tensor([state], dtype=tf.float32)).numpy()[0] 
+        # Accepts a single state or a (N, num_inputs) batch, one row per environment.
+        states = np.asarray(state, dtype=np.float32)
+        batched = states.ndim == 2
+        if not batched:
+            states = states[np.newaxis]
+
+        if self._numpy_actor is not None:
+            actions = self._numpy_actor(states)
+        else:
+            actions = self.actor(tf.convert_to_tensor(states)).numpy()
 
         if ep_count > self._episode_counter:
             self._episode_counter += 1
-            self.gauss.reset()
-
-        for i in range(len(action)):
-            action[i] = np.clip(action[i], -1, 1)
-            # action[i] += self.OU.__call__()
-            # action[i] = self.myOUNoise.get_action(action[i], ep_count)
-            action[i] += self.gauss.noise()
-            action[i] = np.clip(action[i], -1, 1)
-
-        return action
-
-    def feed(self, action, reward, new_state):
-        if self._previous_state != []:
-            if len(self._memory) < self._memory_size:
-                self._memory.append(
-                    (self._previous_state, action, reward, new_state))
-            else:
-                self._memory[self._memory_index] = (
-                    self._previous_state, action, reward, new_state)
-            self._memory_index = (self._memory_index + 1) % self._memory_size
+            if self._my_ou == 0:
+                self.gauss.reset()
+
+        actions = np.clip(actions, -1, 1)
+        actions = self._add_noise(actions, ep_count)
+        actions = np.clip(actions, -1, 1)
+
+        return actions if batched else actions[0]
+
+    def _add_noise(self, actions, ep_count):
+        if self._my_ou == 0:
+            return actions + self.gauss.noise(len(actions))
+
+        assert len(actions) == self._num_envs
+        if self._my_ou == 1:
+            return self.myOUNoise.get_action(actions, ep_count)
+        elif self._my_ou == 2:
+            return actions + self.OU().numpy()
+        return actions
+
+    def reset_noise(self, mask=None):
+        # Restart the OU processes of the environments selected by mask.
+        if self._my_ou == 1:
+            self.myOUNoise.reset(mask)
+
+    def feed(self, action, reward, new_state, done=False):
+        # A read-only memory is a frozen dataset shared between processes.
+        if self._previous_state is not None and self._memory.writable():
+            with self._memory_lock:
+                self._memory.add(self._previous_state, action, reward, new_state, done)
 
         self._previous_state = new_state
 
+    def can_train(self):
+        return len(self._memory) >= 2 * self._batch_size
+
     def train(self):
-        if len(self._memory) < 2 * self._batch_size:
-            return
-
-        # Select a random batch.
-        state_batch = []
-        action_batch = []
-        reward_batch = []
-        next_state_batch = []
-
-        for (state, action, reward, next_state) in random.sample(self._memory, self._batch_size):
-            state_batch.append(state)
-            action_batch.append(action)
-            reward_batch.append([reward])
-            next_state_batch.append(next_state)
-
-        state_batch = tf.convert_to_tensor(state_batch, dtype=tf.float32)
-        action_batch = tf.convert_to_tensor(action_batch, dtype=tf.float32)
-        reward_batch = tf.convert_to_tensor(reward_batch, dtype=tf.float32)
-        next_state_batch = tf.convert_to_tensor(next_state_batch, dtype=tf.float32)
+        # Returns the number of gradient updates done. With updates_per_step
+        # G, each call earns G updates; fractional credit carries over, so
+        # G = 0.25 updates once every 4 calls.
+        if not self.can_train():
+            return 0
+
+        self._update_credit += self._updates_per_step
+        count = int(self._update_credit)
+        if count == 0:
+            return 0
+        self._update_credit -= count
+
+        # Draw all batches at once, weighted by TD error with prioritized replay.
+        with self._memory_lock:
+            if self._prioritized:
+                batch, indices, weights = self._memory.sample_weighted(self._batch_size, count)
+            else:
+                batch = self._memory.sample(count * self._batch_size)
+                weights = self._uniform_weights(count)
+        state_batch, action_batch, reward_batch, next_state_batch, _ = batch
+
+        update_actor = self._episode_counter % 2 == 0
+        if count == 1:
+            td_errors = self._train_step(
+                tf.convert_to_tensor(state_batch),
+                tf.convert_to_tensor(action_batch),
+                tf.convert_to_tensor(reward_batch),
+                tf.convert_to_tensor(next_state_batch),
+                tf.convert_to_tensor(weights),
+                update_actor
+            )
+        else:
+            td_errors = self._train_steps(
+                tf.convert_to_tensor(self._split(state_batch, count)),
+                tf.convert_to_tensor(self._split(action_batch, count)),
+                tf.convert_to_tensor(self._split(reward_batch, count)),
+                tf.convert_to_tensor(self._split(next_state_batch, count)),
+                tf.convert_to_tensor(self._split(weights, count)),
+                update_actor
+            )
+
+        if update_actor:
+            refreshes = self._actor_updates // self._numpy_actor_refresh
+            self._actor_updates += count
+            if self._numpy_actor is not None and self._actor_updates // self._numpy_actor_refresh > refreshes:
+                self._numpy_actor.sync(self.actor)
+
+        if self._prioritized:
+            with self._memory_lock:
+                self._memory.update_priorities(indices, np.reshape(td_errors.numpy(), -1))
+
+        return count
+
+    def _uniform_weights(self, count):
+        if count not in self._uniform_weight_cache:
+            self._uniform_weight_cache[count] = np.ones((count * self._batch_size, 1), dtype=np.float32)
+        return self._uniform_weight_cache[count]
+
+    def _split(self, array, count):
+        return np.reshape(array, (count, self._batch_size) + array.shape[1:])
+
+    def _update_many(self, state_batches, action_batches, reward_batches, next_state_batches, weights, update_actor):
+        # Runs one update per leading slice; compiled, the loop becomes a
+        # single tf.while_loop instead of count Python round-trips.
+        count = tf.shape(state_batches)[0]
+        td_errors = tf.TensorArray(tf.float32, size=count)
+        for i in tf.range(count):
+            td_errors = td_errors.write(i, self._update(
+                state_batches[i], action_batches[i], reward_batches[i],
+                next_state_batches[i], weights[i], update_actor
+            ))
+        return td_errors.stack()
+
+    def _update(self, state_batch, action_batch, reward_batch, next_state_batch, weights, update_actor):
+        # update_actor is a Python bool, so a compiled step is traced once per value.
 
         # Train the critic.
         with tf.GradientTape() as tape:
@@ -138,11 +283,12 @@ class DDPG:
             target_critic_values = reward_batch + self._gamma * self.target_critic(
                 tf.concat([next_state_batch, self.target_actor(next_state_batch)], axis=1)
             )
-            critic_loss = tf.math.reduce_mean(tf.math.square(target_critic_values - critic_values))
+            td_errors = target_critic_values - critic_values
+            critic_loss = tf.math.reduce_mean(weights * tf.math.square(td_errors))
             critic_gradients = tape.gradient(critic_loss, self.critic.trainable_variables)
             self.critic_optimizer.apply_gradients(zip(critic_gradients, self.critic.trainable_variables))
 
-        if self._episode_counter % 2 == 0:
+        if update_actor:
             # Train the actor.
             with tf.GradientTape() as tape:
                 critic_values = self.critic(
@@ -153,26 +299,54 @@ class DDPG:
                 actor_gradients = tape.gradient(actor_loss, self.actor.trainable_variables)
                 self.actor_optimizer.apply_gradients(zip(actor_gradients, self.actor.trainable_variables))
 
-            # Soft update actor
-            for (a, b) in zip(self.target_actor.trainable_variables, self.actor.trainable_variables):
-                a.assign(self._tau * b + (1 - self._tau) * a)
+            if self._target_update_interval == 1:
+                self._soft_update(self._target_tau)
+            else:
+                self._target_counter.assign_add(1)
+                if self._target_counter % self._target_update_interval == 0:
+                    self._soft_update(self._target_tau)
+
+        return td_errors
 
-            # Soft update critic
-            for (a, b) in zip(self.target_critic.trainable_variables, self.critic.trainable_variables):
-                a.assign(self._tau * b + (1 - self._tau) * a)
+    def _soft_update(self, tau):
+        # Polyak averaging of all target variables in one group:
+        # a <- a - tau * (a - b) updates each variable in place with a single
+        # temporary, and compiled it is one fused graph region.
+        tf.group(*[a.assign_sub(tau * (a - b)) for (a, b) in self._target_pairs])
 
     def update_target_networks(self):
         self.target_actor.set_weights(self.actor.get_weights())
         self.target_critic.set_weights(self.critic.get_weights())
 
     def soft_update_target_networks(self):
-        # Soft update actor
-        for (a, b) in zip(self.target_actor.trainable_variables, self.actor.trainable_variables):
-            a.assign(self._tau * b + (1 - self._tau) * a)
+        self._soft_update_step(tf.constant(self._tau, dtype=tf.float32))
 
-        # Soft update critic
-        for (a, b) in zip(self.target_critic.trainable_variables, self.critic.trainable_variables):
-            a.assign(self._tau * b + (1 - self._tau) * a)
+    # The hyperparameters that can change during training (population-based
+    # training); the learning rates are Adam variables and tau is read by the
+    # compiled update, so no retracing is needed.
+    def hyperparameters(self):
+        return {
+            "actor_lr": float(self.actor_optimizer.learning_rate.numpy()),
+            "critic_lr": float(self.critic_optimizer.learning_rate.numpy()),
+            "tau": self._tau,
+            "noise_decay": self._noise_decay,
+        }
+
+    def set_hyperparameters(self, actor_lr=None, critic_lr=None, tau=None, noise_decay=None):
+        if actor_lr is not None:
+            self.actor_optimizer.learning_rate.assign(actor_lr)
+        if critic_lr is not None:
+            self.critic_optimizer.learning_rate.assign(critic_lr)
+        if tau is not None:
+            assert 0 < tau <= 1
+            self._tau = tau
+            self._target_tau.assign(1 - (1 - tau) ** self._target_update_interval)
+        if noise_decay is not None:
+            self._noise_decay = noise_decay
+            if self._my_ou == 0:
+                self.gauss.decay_rate = (3 * noise_decay)/4
+            elif self._my_ou == 1:
+                self.myOUNoise.decay_period = noise_decay
 
     def load_weights(self, filename):
         try:
@@ -180,6 +354,8 @@ class DDPG:
             self.critic.load_weights(filename + "-critic.h5")
             self.target_actor.load_weights(filename + "-actor.h5")
             self.target_critic.load_weights(filename + "-critic.h5")
+            if self._numpy_actor is not None:
+                self._numpy_actor.sync(self.actor)
             return True
         except:
             return False
@@ -187,3 +363,121 @@ class DDPG:
     def save_weights(self, filename):
         self.actor.save_weights(filename + "-actor.h5")
         self.critic.save_weights(filename + "-critic.h5")
+
+    # Full checkpoint: online and target networks, Adam state, the replay
+    # memory, noise and counters. The tf-agents OU process (my_ou == 2) keeps
+    # its state in TensorFlow and restarts on resume.
+    def save_checkpoint(self, path):
+        snapshot = self.snapshot()
+        checkpoint.write(path, lambda directory: self._write_checkpoint(directory, snapshot))
+
+    def load_checkpoint(self, path):
+        path = checkpoint.find(path)
+        if path is None:
+            return False
+        self._read_checkpoint(path)
+        return True
+
+    def _models(self):
+        return {
+            "actor": self.actor,
+            "critic": self.critic,
+            "target_actor": self.target_actor,
+            "target_critic": self.target_critic,
+        }
+
+    def _optimizer_variables(self):
+        optimizers = {"actor": self.actor_optimizer, "critic": self.critic_optimizer}
+        variables = {}
+        for (name, optimizer) in optimizers.items():
+            variables[name] = optimizer.variables
+            if callable(variables[name]):
+                variables[name] = variables[name]()
+        return variables
+
+    # What is learned: the networks, the Adam state and the hyperparameters,
+    # without the counters, the noise or the memory of this agent's own run.
+    def get_learner_state(self):
+        return {
+            "networks": {
+                name: {str(i): w for (i, w) in enumerate(model.get_weights())}
+                for (name, model) in self._models().items()
+            },
+            "optimizers": {
+                name: {str(i): v.numpy() for (i, v) in enumerate(variables)}
+                for (name, variables) in self._optimizer_variables().items()
+            },
+            "hyperparameters": self.hyperparameters(),
+        }
+
+    def set_learner_state(self, state):
+        for (name, model) in self._models().items():
+            weights = state["networks"][name]
+            model.set_weights([weights[str(i)] for i in range(len(weights))])
+        for (name, variables) in self._optimizer_variables().items():
+            values = state["optimizers"][name]
+            assert len(values) == len(variables)
+            for (i, variable) in enumerate(variables):
+                variable.assign(values[str(i)])
+        # Checkpoints written before the hyperparameters were saved lack them.
+        if "hyperparameters" in state:
+            self.set_hyperparameters(**state["hyperparameters"])
+
+        if self._numpy_actor is not None:
+            self._numpy_actor.sync(self.actor)
+
+    def get_state(self):
+        (_, keys, position, has_gauss, cached_gaussian) = np.random.get_state()
+        state = self.get_learner_state()
+        state.update({
+            "episode_counter": self._episode_counter,
+            "actor_updates": self._actor_updates,
+            "update_credit": self._update_credit,
+            "target_counter": int(self._target_counter.numpy()),
+            "numpy_random": {
+                "keys": keys,
+                "position": position,
+                "has_gauss": has_gauss,
+                "cached_gaussian": cached_gaussian,
+            },
+        })
+        if self._my_ou == 0:
+            state["noise"] = self.gauss.get_state()
+        elif self._my_ou == 1:
+            state["noise"] = self.myOUNoise.get_state()
+        return state
+
+    def set_state(self, state):
+        self._episode_counter = state["episode_counter"]
+        self._actor_updates = state["actor_updates"]
+        self._update_credit = state["update_credit"]
+        self._target_counter.assign(state["target_counter"])
+
+        random = state["numpy_random"]
+        np.random.set_state((
+            "MT19937", random["keys"], random["position"],
+            random["has_gauss"], random["cached_gaussian"]
+        ))
+
+        self.set_learner_state(state)
+
+        if self._my_ou == 0:
+            self.gauss.set_state(state["noise"])
+        elif self._my_ou == 1:
+            self.myOUNoise.set_state(state["noise"])
+
+    def snapshot(self):
+        # NumPy copies of everything a checkpoint holds; writing them out with
+        # _write_checkpoint can then happen on another thread.
+        with self._memory_lock:
+            return self.get_state(), self._memory.snapshot()
+
+    def _write_checkpoint(self, directory, snapshot):
+        (state, memory) = snapshot
+        checkpoint.save_state(directory, "agent", state)
+        self._memory.save(os.path.join(directory, "memory"), memory)
+
+    def _read_checkpoint(self, directory):
+        with self._memory_lock:
+            self.set_state(checkpoint.load_state(directory, "agent"))
+            self._memory.load(os.path.join(directory, "memory"))
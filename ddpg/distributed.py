@@ -0,0 +1,180 @@
+import time
+import queue
+import numpy as np
+import multiprocessing as mp
+from .actor_worker import run_actor, actor_noise_sigmas
+from .ddpg import DDPG
+from .trainer import MAX_STEPS, EPISODES, MEMORY_SIZE, SIM_DT
+
+
+class DistributedTrainer:
+    # Ape-X style training: num_actors processes step their own batch of
+    # cart-poles with different exploration noise and stream transitions to
+    # this (learner) process, which owns the DDPG networks and the replay
+    # memory and periodically broadcasts the actor weights back.
+    def __init__(
+            self, num_actors=4, envs_per_actor=8, episodes=EPISODES,
+            max_steps=MAX_STEPS, memory_size=MEMORY_SIZE, sim_dt=SIM_DT,
+            seed=1, tau=0.01, gamma=0.97, batch_size=256,
+            actor_layers=(128, 32), critic_layers=(128, 32),
+            actor_lr=0.0002, critic_lr=0.0003, prioritized=False,
+            jit_compile=False, publish_interval=100, chunk_steps=32,
+            updates_per_chunk=None, noise_base=0.4, noise_alpha=7.0, context="spawn"
+    ):
+        assert num_actors > 0
+        assert envs_per_actor > 0
+        assert sim_dt is not None
+
+        self.num_actors = num_actors
+        self.envs_per_actor = envs_per_actor
+        self.episodes = episodes
+        self.max_steps = max_steps
+        self.sim_dt = sim_dt
+        self.seed = seed
+        self.publish_interval = publish_interval
+        self.chunk_steps = chunk_steps
+        # Gradient updates per received chunk; by default one per transition
+        # batch of a single environment step, like the synchronous loop.
+        if updates_per_chunk is None:
+            updates_per_chunk = chunk_steps
+        self.updates_per_chunk = updates_per_chunk
+        self.sigmas = actor_noise_sigmas(num_actors, noise_base, noise_alpha)
+        self._context = mp.get_context(context)
+
+        # The learner never calls DDPG.action, so its episode counter stays at
+        # zero and the actor is updated on every step.
+        self.agent = DDPG(
+            num_inputs=4,
+            num_outputs=1,
+            seed=seed,
+            tau=tau,
+            gamma=gamma,
+            batch_size=batch_size,
+            memory_size=memory_size,
+            noise_decay=episodes,
+            my_ou=0,
+            actor_layers=list(actor_layers),
+            critic_layers=list(critic_layers),
+            actor_lr=actor_lr,
+            critic_lr=critic_lr,
+            prioritized=prioritized,
+            jit_compile=jit_compile,
+            numpy_actor=True,
+            numpy_actor_refresh=publish_interval
+        )
+
+        self.rewards = []
+        self.episode_steps = []
+        self.episode_actors = []
+        self.stats = {
+            "steps": 0,
+            "updates": 0,
+            "seconds": 0.0,
+            "steps_per_second": 0.0,
+            "updates_per_second": 0.0,
+        }
+
+    def _publish(self, weight_queues):
+        layers = self.agent._numpy_actor.get_layers()
+        for weights in weight_queues:
+            # Replace anything the actor has not picked up yet.
+            try:
+                weights.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                weights.put_nowait(layers)
+            except queue.Full:
+                pass
+
+    def _next_chunk(self, transitions, actors, poll=1.0):
+        # Waits for the next chunk, checking in between that actors are still
+        # running: the learner carries on while any actor is left.
+        while True:
+            try:
+                return transitions.get(timeout=poll)
+            except queue.Empty:
+                pass
+            exitcodes = [process.exitcode for process in actors]
+            if all(code is not None for code in exitcodes):
+                raise RuntimeError(f"All actor processes have exited (exit codes {exitcodes})")
+
+    def _receive(self, chunk):
+        with self.agent._memory_lock:
+            self.agent._memory.add_batch(
+                chunk["states"], chunk["actions"], chunk["rewards"],
+                chunk["next_states"], chunk["dones"]
+            )
+        self.stats["steps"] += len(chunk["states"])
+
+        for (actor, reward, steps) in chunk["episodes"]:
+            self.episode_actors.append(actor)
+            self.rewards.append(reward)
+            self.episode_steps.append(steps)
+
+    def run(self):
+        ctx = self._context
+        transitions = ctx.Queue(maxsize=4 * self.num_actors)
+        weight_queues = [ctx.Queue(maxsize=1) for _ in range(self.num_actors)]
+        stop = ctx.Event()
+
+        # Independent, reproducible noise stream for every actor process.
+        seeds = np.random.SeedSequence(self.seed).spawn(self.num_actors)
+        actors = []
+        for i in range(self.num_actors):
+            process = ctx.Process(
+                target=run_actor,
+                args=(
+                    i, transitions, weight_queues[i], stop, self.sigmas[i],
+                    seeds[i], self.envs_per_actor, self.max_steps,
+                    self.sim_dt, self.chunk_steps
+                ),
+                daemon=True
+            )
+            process.start()
+            actors.append(process)
+
+        start_time = time.perf_counter()
+        self._publish(weight_queues)
+        published = self.agent._actor_updates
+
+        try:
+            while len(self.rewards) < self.episodes:
+                self._receive(self._next_chunk(transitions, actors))
+                for _ in range(self.updates_per_chunk):
+                    self.stats["updates"] += self.agent.train()
+
+                if self.agent._actor_updates - published >= self.publish_interval:
+                    self._publish(weight_queues)
+                    published = self.agent._actor_updates
+        finally:
+            stop.set()
+            # Drain the queue so no actor stays blocked on a full queue.
+            while any(process.is_alive() for process in actors):
+                try:
+                    transitions.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            for process in actors:
+                process.join()
+
+        seconds = time.perf_counter() - start_time
+        self.stats["seconds"] = seconds
+        self.stats["steps_per_second"] = self.stats["steps"] / seconds
+        self.stats["updates_per_second"] = self.stats["updates"] / seconds
+        print(f"~~~~~ Steps/s: {self.stats['steps_per_second']:.1f}; Updates/s: {self.stats['updates_per_second']:.1f}")
+
+        return {
+            "rewards": np.array(self.rewards[:self.episodes]),
+            "steps": np.array(self.episode_steps[:self.episodes]),
+            "actors": np.array(self.episode_actors[:self.episodes]),
+        }
+
+    def save_weights(self, filename):
+        self.agent.save_weights(filename)
+
+
+if __name__ == "__main__":
+    trainer = DistributedTrainer()
+    metrics = trainer.run()
+    np.save("rewards_distributed.npy", metrics["rewards"])
@@ -0,0 +1,53 @@
+import numpy as np
+
+
+# Solved threshold for the rolling episode reward, the line drawn by
+# util/plot_rewards.py.
+REWARD_THRESHOLD = 195.0
+
+
+class EarlyStopping:
+    # Ends a run on the rolling mean of the last `window` episode rewards:
+    # "converged" once it has stayed at or above `threshold` for `patience`
+    # episodes, "stalled" once its best value is `stall_patience` episodes
+    # old (a run that diverged after learning, or never learned). Everything
+    # is computed from the reward history, so a run resumed from a checkpoint
+    # picks up where it stopped.
+    def __init__(self, threshold=REWARD_THRESHOLD, window=100, patience=100, stall_patience=None):
+        assert window > 0
+        assert patience > 0
+
+        self.threshold = threshold
+        self.window = window
+        self.patience = patience
+        self.stall_patience = stall_patience
+
+    def rolling(self, rewards):
+        rewards = np.asarray(rewards, dtype=np.float64)
+        if len(rewards) < self.window:
+            return np.zeros(0)
+        sums = np.cumsum(np.concatenate(([0.0], rewards)))
+        return (sums[self.window:] - sums[:-self.window]) / self.window
+
+    def check(self, rewards):
+        # Returns "converged", "stalled" or None for the rewards so far.
+        rolling = self.rolling(rewards)
+        if len(rolling) == 0:
+            return None
+
+        below = np.flatnonzero(rolling < self.threshold)
+        held = len(rolling) - (below[-1] + 1 if len(below) else 0)
+        if held >= self.patience:
+            return "converged"
+
+        if self.stall_patience is not None and len(rolling) - 1 - np.argmax(rolling) >= self.stall_patience:
+            return "stalled"
+        return None
+
+    # Used as a Trainer episode hook.
+    def __call__(self, trainer, episode, reward, steps):
+        reason = self.check(trainer.metrics["rewards"][:episode + 1])
+        if reason is not None:
+            trainer.stop_reason = reason
+            print(f"~~~~~ Stopping early at episode {episode}: {reason}")
+            trainer.stop()
@@ -0,0 +1,130 @@
+import os
+import argparse
+import numpy as np
+import multiprocessing as mp
+from .numpy_actor import NumpyActor
+from env.vector_scenery import VectorScenery
+
+
+# Noise-free, training-free evaluation of a saved actor. Every job plays one
+# episode in each of num_envs cart-poles at once (VectorScenery), starting
+# from states perturbed uniformly by up to init_noise; jobs get independent
+# seeds and run in worker processes that only need NumPy.
+# Run as: python3 -m ddpg.evaluate pretrained_cartpole-model
+
+MAX_STEPS = 500
+DT = 0.02
+EPISODES = 4096
+ENVS_PER_JOB = 512
+# Half-widths for (position, speed, angle, angular speed), angles in degrees.
+INIT_NOISE = (0.1, 0.1, 2.0, 5.0)
+
+
+def load_policy(path):
+    # A frozen .npz policy, or the prefix of <prefix>-actor.h5 (needs Keras).
+    if path.endswith(".npz"):
+        return NumpyActor.load(path)
+    from .export_policy import load_actor
+    return load_actor(path)
+
+
+def rollout(layers, seed, num_envs, max_steps=MAX_STEPS, dt=DT, init_noise=INIT_NOISE):
+    actor = NumpyActor.from_layers(layers)
+    rng = np.random.default_rng(seed)
+    scenery = VectorScenery(num_envs, max_steps)
+    scenery.randomize(np.ones(num_envs, dtype=bool), init_noise, rng)
+
+    rewards = np.zeros(num_envs)
+    steps = np.zeros(num_envs, dtype=np.int64)
+    failed = np.zeros(num_envs, dtype=bool)
+    # Only the first episode of every environment counts; the ones that
+    # already finished keep being stepped (auto-reset) but are ignored.
+    running = np.ones(num_envs, dtype=bool)
+
+    states = scenery.get_current_state()
+    while running.any():
+        # Same as DDPG.action, without the exploration noise.
+        actions = np.clip(actor(states)[:, 0], -1, 1)
+        scenery._apply_action(actions)
+        scenery.tick(dt)
+        (_, step_rewards, terminated, truncated) = scenery.post_tick()
+
+        rewards[running] += step_rewards[running]
+        steps[running] += 1
+        ended = running & terminated
+        failed[ended] = ~truncated[ended]
+        running &= ~terminated
+        states = scenery.get_current_state()
+
+    return rewards, steps, failed
+
+
+def evaluate(
+        actor, episodes=EPISODES, seed=0, max_steps=MAX_STEPS, dt=DT,
+        init_noise=INIT_NOISE, envs_per_job=ENVS_PER_JOB, processes=None,
+        context="spawn"
+):
+    jobs = max(1, -(-episodes // envs_per_job))
+    sizes = np.full(jobs, episodes // jobs)
+    sizes[:episodes % jobs] += 1
+    seeds = np.random.SeedSequence(seed).spawn(jobs)
+    arguments = [
+        (actor.get_layers(), seeds[i], int(sizes[i]), max_steps, dt, init_noise)
+        for i in range(jobs)
+    ]
+
+    if processes is None:
+        processes = os.cpu_count()
+    processes = min(processes, jobs)
+    if processes <= 1:
+        results = [rollout(*job) for job in arguments]
+    else:
+        with mp.get_context(context).Pool(processes) as pool:
+            results = pool.starmap(rollout, arguments)
+
+    rewards, steps, failed = (np.concatenate(values) for values in zip(*results))
+    return {"rewards": rewards, "steps": steps, "failed": failed}
+
+
+def summarize(result, dt=DT, percentiles=(5, 50, 95)):
+    rewards = result["rewards"]
+    steps = result["steps"]
+    failed = result["failed"]
+    summary = {
+        "episodes": len(rewards),
+        "reward_mean": float(rewards.mean()),
+        "reward_std": float(rewards.std()),
+        "steps_mean": float(steps.mean()),
+        # Episodes that lasted until max_steps without failing.
+        "survival_rate": float(1 - failed.mean()),
+    }
+    for p in percentiles:
+        summary[f"reward_p{p}"] = float(np.percentile(rewards, p))
+        summary[f"steps_p{p}"] = float(np.percentile(steps, p))
+        # Simulated seconds until the pole fell or the cart left the track,
+        # over the failed episodes only.
+        summary[f"time_to_fail_p{p}"] = float(np.percentile(steps[failed] * dt, p)) if failed.any() else None
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a saved actor without noise or training.")
+    parser.add_argument("policy", help="weights prefix (<prefix>-actor.h5) or a policy .npz")
+    parser.add_argument("--episodes", type=int, default=EPISODES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-steps", type=int, default=MAX_STEPS)
+    parser.add_argument("--dt", type=float, default=DT)
+    parser.add_argument("--init-noise", type=float, nargs=4, default=INIT_NOISE)
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--output", help="save the per-episode arrays to this .npz file")
+    arguments = parser.parse_args()
+
+    result = evaluate(
+        load_policy(arguments.policy), arguments.episodes, arguments.seed,
+        arguments.max_steps, arguments.dt, arguments.init_noise,
+        processes=arguments.processes
+    )
+    for (name, value) in summarize(result, arguments.dt).items():
+        print(f"~~~~~ {name}: {value if value is None or isinstance(value, int) else f'{value:.3f}'}")
+    if arguments.output is not None:
+        np.savez(arguments.output, **result)
@@ -0,0 +1,54 @@
+import argparse
+import h5py
+from .numpy_actor import NumpyActor
+
+
+# Freezes the actor saved as <prefix>-actor.h5 into <prefix>-actor.npz, which
+# NumpyActor.load (and the policy server) read without TensorFlow.
+# Run as: python3 -m ddpg.export_policy pretrained_cartpole-model
+
+
+def actor_layers(filename):
+    # Output sizes of the Dense layers, in order, read from the kernel shapes
+    # in an .h5 weights file.
+    sizes = []
+    with h5py.File(filename, "r") as f:
+        for layer in f.attrs["layer_names"]:
+            for weight in f[layer].attrs["weight_names"]:
+                if weight.endswith("kernel:0"):
+                    sizes.append(f[layer][weight].shape[1])
+    return sizes
+
+
+def load_actor(prefix, layers=None, num_inputs=4, num_outputs=1):
+    # Loads <prefix>-actor.h5 through Keras and returns it as a NumpyActor.
+    from .ddpg import DDPG
+
+    weights = prefix + "-actor.h5"
+    if layers is None:
+        layers = actor_layers(weights)[:-1]
+
+    agent = DDPG(
+        num_inputs=num_inputs, num_outputs=num_outputs, seed=1, tau=0.01,
+        gamma=0.97, batch_size=1, memory_size=1, noise_decay=1, my_ou=0,
+        actor_layers=list(layers), critic_layers=list(layers),
+        actor_lr=0.0002, critic_lr=0.0003
+    )
+    agent.actor.load_weights(weights)
+    return NumpyActor(agent.actor)
+
+
+def export(prefix, filename=None, layers=None, num_inputs=4, num_outputs=1):
+    if filename is None:
+        filename = prefix + "-actor.npz"
+    load_actor(prefix, layers, num_inputs, num_outputs).save(filename)
+    return filename
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a trained actor as a NumPy policy.")
+    parser.add_argument("prefix", help="weights prefix, e.g. pretrained_cartpole-model")
+    parser.add_argument("--output", help="policy file, <prefix>-actor.npz by default")
+    parser.add_argument("--layers", type=int, nargs="+", help="hidden layer sizes, read from the file by default")
+    arguments = parser.parse_args()
+    print(f"~~~~~ Policy written to {export(arguments.prefix, arguments.output, arguments.layers)}")
@@ -0,0 +1,96 @@
+import numpy as np
+
+
+def _relu(x):
+    return np.maximum(x, 0.0, out=x)
+
+
+def _tanh(x):
+    return np.tanh(x, out=x)
+
+
+def _linear(x):
+    return x
+
+
+ACTIVATIONS = {
+    "relu": _relu,
+    "tanh": _tanh,
+    "linear": _linear,
+}
+
+
+class NumpyActor:
+    # Mirror of a Sequential Dense/Activation network in plain NumPy arrays. It
+    # avoids the Keras dispatch cost when evaluating the actor on a single
+    # state, and has to be synced after the Keras weights change.
+    def __init__(self, model=None):
+        self._layers = []
+        if model is not None:
+            self.sync(model)
+
+    # Layers are (kernel, bias, activation name) tuples, kernel and bias being
+    # None for activation-only layers. They pickle cheaply, which lets the
+    # weights be sent to processes that never import TensorFlow.
+    @classmethod
+    def from_layers(cls, layers):
+        actor = cls()
+        actor.set_layers(layers)
+        return actor
+
+    def get_layers(self):
+        return list(self._layers)
+
+    def set_layers(self, layers):
+        self._layers = list(layers)
+
+    # Frozen policy: the layers as plain arrays in an .npz file, loadable with
+    # nothing but NumPy.
+    def save(self, filename):
+        arrays = {"activations": np.array([activation for (_, _, activation) in self._layers])}
+        for (i, (kernel, bias, _)) in enumerate(self._layers):
+            if kernel is not None:
+                arrays[f"kernel_{i}"] = kernel
+                arrays[f"bias_{i}"] = bias
+        np.savez(filename, **arrays)
+
+    @classmethod
+    def load(cls, filename):
+        layers = []
+        with np.load(filename, allow_pickle=False) as arrays:
+            for (i, activation) in enumerate(arrays["activations"]):
+                if f"kernel_{i}" in arrays.files:
+                    layers.append((arrays[f"kernel_{i}"], arrays[f"bias_{i}"], str(activation)))
+                else:
+                    layers.append((None, None, str(activation)))
+        return cls.from_layers(layers)
+
+    def shape(self):
+        # (number of inputs, number of outputs)
+        kernels = [kernel for (kernel, _, _) in self._layers if kernel is not None]
+        return kernels[0].shape[0], kernels[-1].shape[1]
+
+    def sync(self, model):
+        layers = []
+        for layer in model.layers:
+            config = layer.get_config()
+            weights = layer.get_weights()
+            if weights:
+                kernel, bias = weights
+                layers.append((
+                    np.ascontiguousarray(kernel, dtype=np.float32),
+                    np.ascontiguousarray(bias, dtype=np.float32),
+                    config.get("activation", "linear")
+                ))
+            else:
+                layers.append((None, None, config["activation"]))
+        self._layers = layers
+
+    def __call__(self, states):
+        x = np.asarray(states, dtype=np.float32)
+        for (kernel, bias, activation) in self._layers:
+            if kernel is not None:
+                x = x @ kernel
+                x += bias
+            x = ACTIVATIONS[activation](x)
+        return x
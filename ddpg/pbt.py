@@ -0,0 +1,250 @@
+import argparse
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from . import checkpoint
+from .sweep import init_worker
+from .trainer import EPISODES
+
+
+# Population-based training: `members` DDPG agents, each a headless Trainer
+# in its own process, train side by side with their own hyperparameters.
+# Every `interval` episodes they are ranked by their mean reward over that
+# interval; each of the worst `fraction` copies the networks and Adam state
+# of a random one of the best `fraction` (exploit) and continues with that
+# member's hyperparameters, each multiplied by one of PERTURB (explore).
+# Replay memories, noise and counters stay with their member.
+#
+# Every member has a shared memory block that holds its learner state (see
+# DDPG.get_learner_state) as flat arrays; the pipes only carry commands,
+# scores and hyperparameters.
+# Run as: python3 -m ddpg.pbt --members 8 --interval 50 --episodes 1000
+
+MEMBERS = 8
+INTERVAL = 50
+FRACTION = 0.25
+PERTURB = (0.8, 1.25)
+# Starting values, spread over [value / SPREAD, value * SPREAD] log-uniformly.
+HYPERPARAMETERS = {
+    "actor_lr": 0.0002,
+    "critic_lr": 0.0003,
+    "tau": 0.01,
+    "noise_decay": EPISODES,
+}
+SPREAD = 2.0
+BOUNDS = {
+    "actor_lr": (1e-5, 1e-2),
+    "critic_lr": (1e-5, 1e-2),
+    "tau": (1e-4, 0.5),
+    "noise_decay": (10, 1e6),
+}
+
+
+# A learner state is laid out in its block as (dotted key, shape, dtype,
+# offset) entries, with scalars (the hyperparameters) as 0-d float64 arrays.
+# All members share the network sizes, so one layout fits every block.
+
+def _layout(state):
+    layout = []
+    offset = 0
+    for (key, value) in checkpoint.flatten(state).items():
+        value = np.asarray(value, dtype=np.float64 if isinstance(value, float) else None)
+        layout.append((key, value.shape, value.dtype.str, offset))
+        # 8-byte aligned.
+        offset += -(-value.nbytes // 8) * 8
+    return layout, offset
+
+
+def _view(block, entry):
+    (_, shape, dtype, offset) = entry
+    return np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)
+
+
+def _write(block, layout, state):
+    flat = checkpoint.flatten(state)
+    for entry in layout:
+        _view(block, entry)[...] = flat[entry[0]]
+
+
+def _read(block, layout):
+    flat = {}
+    for entry in layout:
+        value = _view(block, entry)
+        flat[entry[0]] = value.item() if value.ndim == 0 else value.copy()
+    return checkpoint.unflatten(flat)
+
+
+def _member(conn, index, arguments, threads):
+    init_worker(threads)
+    from .trainer import Trainer
+
+    trainer = Trainer(**arguments)
+    (layout, size) = _layout(trainer.agent.get_learner_state())
+    conn.send((layout, size))
+    blocks = [shared_memory.SharedMemory(name=name) for name in conn.recv()]
+
+    try:
+        while True:
+            (command, argument) = conn.recv()
+            if command == "train":
+                # Train up to episode `until`; answer with the mean reward of
+                # the last `window` episodes.
+                (until, window) = argument
+                trainer.run(until=until)
+                conn.send(float(trainer.metrics["rewards"][max(0, trainer.episode - window):trainer.episode].mean()))
+                continue
+            elif command == "publish":
+                _write(blocks[index], layout, trainer.agent.get_learner_state())
+            elif command == "exploit":
+                (donor, hyperparameters) = argument
+                trainer.agent.set_learner_state(_read(blocks[donor], layout))
+                trainer.agent.set_hyperparameters(**hyperparameters)
+            elif command == "save":
+                trainer.save_weights(argument)
+            conn.send(None)
+            if command == "close":
+                break
+    finally:
+        for block in blocks:
+            block.close()
+        conn.close()
+
+
+class PopulationTrainer:
+    def __init__(
+            self, members=MEMBERS, interval=INTERVAL, episodes=EPISODES,
+            fraction=FRACTION, seed=1, threads_per_member=1, context="spawn",
+            **trainer_arguments
+    ):
+        assert members > 1
+        assert 0 < interval <= episodes
+        assert 0 < fraction <= 0.5
+        # Members have to reach every interval end; an early-stopped one
+        # would keep its stale score.
+        assert trainer_arguments.get("stop_reward") is None
+        assert trainer_arguments.get("stall_patience") is None
+
+        self.members = members
+        self.interval = interval
+        self.episodes = episodes
+        self.count = max(1, int(members * fraction))
+        self.seed = seed
+        self.threads_per_member = threads_per_member
+        self.trainer_arguments = dict(trainer_arguments, episodes=episodes)
+        self._context = mp.get_context(context)
+        self._rng = np.random.default_rng(seed)
+
+        self.hyperparameters = [self._sample() for _ in range(members)]
+        # One entry per interval: the scores and the hyperparameters they
+        # were reached with.
+        self.history = []
+
+    def _clip(self, hyperparameters):
+        return {
+            name: float(np.clip(value, *BOUNDS[name]))
+            for (name, value) in hyperparameters.items()
+        }
+
+    def _sample(self):
+        return self._clip({
+            name: value * np.exp(self._rng.uniform(-np.log(SPREAD), np.log(SPREAD)))
+            for (name, value) in HYPERPARAMETERS.items()
+        })
+
+    def _perturb(self, hyperparameters):
+        return self._clip({
+            name: value * self._rng.choice(PERTURB)
+            for (name, value) in hyperparameters.items()
+        })
+
+    def _send(self, connections, members, command, arguments=None):
+        for i in members:
+            connections[i].send((command, None if arguments is None else arguments[i]))
+        return [connections[i].recv() for i in members]
+
+    def _exploit(self, connections, scores):
+        # Everyone has stopped training when this runs, so the donors' blocks
+        # do not change while the others read them.
+        ranking = np.argsort(scores)[::-1]
+        top = ranking[:self.count]
+        bottom = ranking[-self.count:]
+        self._send(connections, top, "publish")
+
+        arguments = {}
+        for member in bottom:
+            donor = int(self._rng.choice(top))
+            self.hyperparameters[member] = self._perturb(self.hyperparameters[donor])
+            arguments[member] = (donor, self.hyperparameters[member])
+            print(f"~~~~~ Member {member} <- {donor}: {self.hyperparameters[member]}")
+        self._send(connections, bottom, "exploit", arguments)
+
+    def run(self, weights_path=None):
+        # Returns the scores (intervals x members); with weights_path the best
+        # member of the last interval saves its weights there.
+        connections = []
+        processes = []
+        for i in range(self.members):
+            (parent, child) = self._context.Pipe()
+            arguments = dict(self.trainer_arguments, seed=self.seed + i, **self.hyperparameters[i])
+            process = self._context.Process(
+                target=_member, args=(child, i, arguments, self.threads_per_member), daemon=True
+            )
+            process.start()
+            child.close()
+            connections.append(parent)
+            processes.append(process)
+
+        blocks = []
+        try:
+            (layout, size) = [conn.recv() for conn in connections][0]
+            blocks = [shared_memory.SharedMemory(create=True, size=max(1, size)) for _ in range(self.members)]
+            for conn in connections:
+                conn.send([block.name for block in blocks])
+
+            ends = list(range(self.interval, self.episodes, self.interval)) + [self.episodes]
+            for (i, end) in enumerate(ends):
+                scores = self._send(connections, range(self.members), "train", [(end, self.interval)] * self.members)
+                self.history.append({
+                    "episodes": end,
+                    "scores": scores,
+                    "hyperparameters": [dict(h) for h in self.hyperparameters],
+                })
+                best = int(np.argmax(scores))
+                print(f"~~~~~ Episode {end}: best member {best} ({scores[best]:.1f}); mean {np.mean(scores):.1f}")
+                if i + 1 < len(ends):
+                    self._exploit(connections, scores)
+
+            if weights_path is not None:
+                self._send(connections, [best], "save", {best: weights_path})
+            self._send(connections, range(self.members), "close")
+        finally:
+            # Closed pipes also end members still waiting for a command.
+            for conn in connections:
+                conn.close()
+            for process in processes:
+                process.join()
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        return np.array([entry["scores"] for entry in self.history])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Population-based training of DDPG agents.")
+    parser.add_argument("--members", type=int, default=MEMBERS)
+    parser.add_argument("--interval", type=int, default=INTERVAL, help="episodes between exploit steps")
+    parser.add_argument("--episodes", type=int, default=EPISODES)
+    parser.add_argument("--fraction", type=float, default=FRACTION, help="share of members replaced each time")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=1, help="TensorFlow threads per member")
+    parser.add_argument("--save", help="weights prefix for the best member, e.g. cartpole-model")
+    arguments = parser.parse_args()
+
+    trainer = PopulationTrainer(
+        arguments.members, arguments.interval, arguments.episodes,
+        arguments.fraction, arguments.seed, arguments.threads
+    )
+    trainer.run(arguments.save)
+    for (name, value) in trainer.history[-1]["hyperparameters"][int(np.argmax(trainer.history[-1]["scores"]))].items():
+        print(f"~~~~~ {name}: {value:.6g}")
@@ -0,0 +1,332 @@
+import os
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+import traceback
+import socketserver
+import numpy as np
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from .numpy_actor import NumpyActor
+
+
+# Serves a frozen policy (see ddpg/export_policy.py) to local controllers,
+# over a Unix socket and/or localhost HTTP, with nothing but NumPy.
+# Run as: python3 -m ddpg.policy_server pretrained_cartpole-model-actor.npz --socket /tmp/cartpole.sock
+#
+# Unix socket protocol: the client sends a state as num_inputs float32 values
+# and reads back num_outputs float32 values, any number of times per
+# connection. HTTP: POST /act with {"state": [...]}, answered with
+# {"action": [...]}; GET /stats returns the latency statistics.
+
+
+class PolicyError(Exception):
+    # The actor failed on the batch a request was part of.
+    pass
+
+
+class _Request:
+    __slots__ = ("state", "action", "error", "start", "done")
+
+    def __init__(self, state):
+        self.state = state
+        self.action = None
+        self.error = None
+        self.start = time.perf_counter()
+        self.done = threading.Event()
+
+
+class PolicyServer:
+    # Requests from concurrent connections are queued and evaluated together:
+    # the batching thread takes the first waiting request, adds whatever else
+    # arrives within max_delay seconds (up to max_batch) and runs the actor
+    # once for all of them. With max_delay=0 only requests that are already
+    # waiting are batched, which adds no latency when the load is low.
+    def __init__(self, actor, max_batch=64, max_delay=0.0, latency_window=100000):
+        assert max_batch > 0
+
+        self.actor = actor
+        (self.num_inputs, self.num_outputs) = actor.shape()
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        self._requests = queue.Queue()
+        # Guards _running, so that no request is queued after the batching
+        # thread was told to stop (or before it started): it would never be
+        # answered.
+        self._lock = threading.Lock()
+        self._running = False
+        self._latencies = np.zeros(latency_window)
+        self.requests = 0
+        self.batches = 0
+
+        self._servers = []
+        self._threads = []
+        self._socket_path = None
+
+    @classmethod
+    def load(cls, filename, **kwargs):
+        return cls(NumpyActor.load(filename), **kwargs)
+
+    def act(self, state):
+        # Called from the connection threads; waits for the request's batch.
+        # Raises ValueError for a state of the wrong size, RuntimeError when
+        # the server is not running and PolicyError when the actor failed.
+        state = np.asarray(state, dtype=np.float32)
+        if state.size != self.num_inputs:
+            raise ValueError(f"Expected a state of {self.num_inputs} values, got {state.size}")
+        request = _Request(state.reshape(self.num_inputs))
+        with self._lock:
+            if not self._running:
+                raise RuntimeError("Policy server is not running")
+            self._requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise PolicyError("Policy evaluation failed") from request.error
+        return request.action
+
+    def _collect(self):
+        batch = [self._requests.get()]
+        if batch[0] is None:
+            return None
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                request = self._requests.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if request is None:
+                # Shut down once this batch is answered.
+                self._requests.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _serve_batches(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            try:
+                actions = self.actor(np.stack([request.state for request in batch]))
+            except Exception as error:
+                # Fail this batch's requests and keep serving the next ones.
+                traceback.print_exc()
+                for request in batch:
+                    request.error = error
+                    request.done.set()
+                continue
+            done = time.perf_counter()
+            for (request, action) in zip(batch, actions):
+                request.action = action
+                self._latencies[self.requests % len(self._latencies)] = done - request.start
+                self.requests += 1
+                request.done.set()
+            self.batches += 1
+
+    def stats(self):
+        # Latency from a request being queued to its action being ready, over
+        # the last latency_window requests, in milliseconds.
+        latencies = self._latencies[:min(self.requests, len(self._latencies))] * 1000
+        if len(latencies) == 0:
+            return {"requests": 0, "batches": 0, "mean_batch": 0.0, "p50_ms": 0.0, "p99_ms": 0.0}
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch": self.requests / self.batches,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+        }
+
+    def _thread(self, target):
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def start(self):
+        with self._lock:
+            self._running = True
+        self._thread(self._serve_batches)
+        return self
+
+    def serve_unix(self, path):
+        if os.path.exists(path):
+            os.unlink(path)
+        server = socketserver.ThreadingUnixStreamServer(path, _UnixHandler)
+        server.daemon_threads = True
+        server.policy = self
+        self._servers.append(server)
+        self._socket_path = path
+        self._thread(server.serve_forever)
+
+    def serve_http(self, port, host="127.0.0.1"):
+        server = ThreadingHTTPServer((host, port), _HttpHandler)
+        server.daemon_threads = True
+        server.policy = self
+        self._servers.append(server)
+        self._thread(server.serve_forever)
+        return server.server_address[1]
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        # Requests queued before the None are still answered.
+        with self._lock:
+            if self._running:
+                self._running = False
+                self._requests.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self._socket_path is not None and os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+        self._servers = []
+        self._threads = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class _UnixHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        policy = self.server.policy
+        size = 4 * policy.num_inputs
+        while True:
+            data = self.rfile.read(size)
+            if len(data) < size:
+                return
+            try:
+                action = policy.act(np.frombuffer(data, dtype=np.float32))
+            except (RuntimeError, PolicyError):
+                # Stopped or failed: close the connection.
+                return
+            self.wfile.write(np.asarray(action, dtype=np.float32).tobytes())
+
+
+class _HttpHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so a controller does not reconnect for every action.
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length < 0:
+                raise ValueError
+        except ValueError:
+            # Without a usable length the body cannot be skipped, so the
+            # connection is closed after the reply.
+            self.close_connection = True
+            self._reply(400, {"error": "Invalid Content-Length"})
+            return
+        data = self.rfile.read(length)
+        if self.path != "/act":
+            self._reply(404, {"error": "POST /act with {\"state\": [...]}"})
+            return
+        try:
+            body = json.loads(data)
+            if not isinstance(body, dict) or "state" not in body:
+                raise ValueError("Expected {\"state\": [...]}")
+            action = self.server.policy.act(body["state"])
+        except (ValueError, TypeError) as error:
+            # json.JSONDecodeError is a ValueError.
+            self._reply(400, {"error": str(error)})
+            return
+        except RuntimeError as error:
+            self._reply(503, {"error": str(error)})
+            return
+        except PolicyError as error:
+            self._reply(500, {"error": str(error)})
+            return
+        self._reply(200, {"action": action.tolist()})
+
+    def do_GET(self):
+        if self.path != "/stats":
+            self._reply(404, {"error": "GET /stats"})
+            return
+        self._reply(200, self.server.policy.stats())
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PolicyClient:
+    # Client for the Unix socket protocol, keeping one connection open.
+    def __init__(self, path, num_inputs=4, num_outputs=1):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(path)
+        self._num_inputs = num_inputs
+        self._size = 4 * num_outputs
+
+    def act(self, state):
+        self._socket.sendall(np.asarray(state, dtype=np.float32).reshape(self._num_inputs).tobytes())
+        data = b""
+        while len(data) < self._size:
+            chunk = self._socket.recv(self._size - len(data))
+            if not chunk:
+                raise ConnectionError("Policy server closed the connection")
+            data += chunk
+        return np.frombuffer(data, dtype=np.float32)
+
+    def close(self):
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a frozen policy to local controllers.")
+    parser.add_argument("policy", help="policy file written by ddpg.export_policy")
+    parser.add_argument("--socket", help="Unix socket path")
+    parser.add_argument("--port", type=int, help="localhost HTTP port")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-delay", type=float, default=0.0, help="seconds to wait for a batch to fill")
+    parser.add_argument("--report", type=float, default=10.0, help="seconds between latency reports")
+    arguments = parser.parse_args()
+    if arguments.socket is None and arguments.port is None:
+        parser.error("give --socket and/or --port")
+
+    server = PolicyServer.load(arguments.policy, max_batch=arguments.max_batch, max_delay=arguments.max_delay)
+    server.start()
+    if arguments.socket is not None:
+        server.serve_unix(arguments.socket)
+        print(f"~~~~~ Serving on {arguments.socket}")
+    if arguments.port is not None:
+        port = server.serve_http(arguments.port)
+        print(f"~~~~~ Serving on http://127.0.0.1:{port}")
+
+    try:
+        while True:
+            time.sleep(arguments.report)
+            stats = server.stats()
+            print(
+                f"~~~~~ Requests: {stats['requests']}; Mean batch: {stats['mean_batch']:.1f}; "
+                f"p50: {stats['p50_ms']:.3f} ms; p99: {stats['p99_ms']:.3f} ms"
+            )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
@@ -0,0 +1,290 @@
+import os
+import json
+import numpy as np
+from .sum_tree import SumTree
+
+
+def _write_json(filename, data):
+    with open(filename + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(filename + ".tmp", filename)
+
+
+def _read_json(filename):
+    if not os.path.isfile(filename):
+        return None
+    with open(filename) as f:
+        return json.load(f)
+
+
+class ReplayBuffer:
+    FIELDS = ("states", "actions", "rewards", "next_states", "dones")
+
+    def __init__(self, capacity, state_size, action_size):
+        assert capacity > 0
+
+        self._capacity = capacity
+        self._index = 0
+        self._size = 0
+
+        self.states = self._allocate("states", (capacity, state_size))
+        self.actions = self._allocate("actions", (capacity, action_size))
+        self.rewards = self._allocate("rewards", (capacity, 1))
+        self.next_states = self._allocate("next_states", (capacity, state_size))
+        self.dones = self._allocate("dones", (capacity, 1))
+
+    def _allocate(self, name, shape):
+        return np.zeros(shape, dtype=np.float32)
+
+    def __len__(self):
+        return self._size
+
+    def capacity(self):
+        return self._capacity
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def _meta(self):
+        return {
+            "capacity": self._capacity,
+            "state_size": self.states.shape[1],
+            "action_size": self.actions.shape[1],
+            "index": self._index,
+            "size": self._size,
+        }
+
+    def _check_meta(self, meta):
+        assert meta["capacity"] == self._capacity
+        assert meta["state_size"] == self.states.shape[1]
+        assert meta["action_size"] == self.actions.shape[1]
+
+    # Checkpointing: the filled rows of every array go to a plain .npy file
+    # (no pickling) under path, the ring position to meta.json.
+    def _arrays(self):
+        return {name: getattr(self, name)[:self._size] for name in self.FIELDS}
+
+    def snapshot(self):
+        # A copy that another thread can save while the buffer keeps changing.
+        arrays = {name: array.copy() for (name, array) in self._arrays().items()}
+        return arrays, self._meta()
+
+    def save(self, path, snapshot=None):
+        (arrays, meta) = (self._arrays(), self._meta()) if snapshot is None else snapshot
+        os.makedirs(path, exist_ok=True)
+        for (name, array) in arrays.items():
+            np.save(os.path.join(path, name + ".npy"), array)
+        _write_json(os.path.join(path, "meta.json"), meta)
+
+    def load(self, path):
+        meta = _read_json(os.path.join(path, "meta.json"))
+        self._check_meta(meta)
+        for name in self.FIELDS:
+            getattr(self, name)[:meta["size"]] = np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+        self._index = meta["index"]
+        self._size = meta["size"]
+        return meta
+
+    def add(self, state, action, reward, next_state, done=False):
+        i = self._index
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+
+        self._index = (i + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
+        return i
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        # Insert many transitions at once, wrapping around the end of the ring.
+        count = min(len(states), self._capacity)
+        indices = (self._index + np.arange(count)) % self._capacity
+        self.states[indices] = states[-count:]
+        self.actions[indices] = actions[-count:]
+        self.rewards[indices] = np.reshape(rewards, (-1, 1))[-count:]
+        self.next_states[indices] = next_states[-count:]
+        self.dones[indices] = np.reshape(dones, (-1, 1))[-count:]
+
+        self._index = (self._index + count) % self._capacity
+        self._size = min(self._size + count, self._capacity)
+        return indices
+
+    def sample_indices(self, batch_size):
+        return np.random.randint(0, self._size, size=batch_size)
+
+    def gather(self, indices):
+        return (
+            self.states[indices],
+            self.actions[indices],
+            self.rewards[indices],
+            self.next_states[indices],
+            self.dones[indices]
+        )
+
+    def sample(self, batch_size):
+        return self.gather(self.sample_indices(batch_size))
+
+
+class MemmapReplayBuffer(ReplayBuffer):
+    # Keeps every array in an .npy file under `path`, so the buffer can be
+    # larger than RAM, is reopened instantly by a later run and can be mapped
+    # read-only by several processes at once without copying.
+    def __init__(self, path, capacity, state_size, action_size, read_only=False):
+        self._path = path
+        self._read_only = read_only
+
+        meta = self._read_meta()
+        if meta is None:
+            assert not read_only, f"No replay buffer to open at {path}"
+            os.makedirs(path, exist_ok=True)
+            self._create = True
+        else:
+            self._create = False
+
+        super().__init__(capacity, state_size, action_size)
+
+        if meta is not None:
+            self._check_meta(meta)
+            self._index = meta["index"]
+            self._size = meta["size"]
+        else:
+            self.flush()
+
+    @classmethod
+    def open(cls, path, read_only=False):
+        meta = _read_json(os.path.join(path, "meta.json"))
+        return cls(
+            path, meta["capacity"], meta["state_size"], meta["action_size"], read_only
+        )
+
+    def _allocate(self, name, shape):
+        filename = os.path.join(self._path, name + ".npy")
+        if self._create:
+            return np.lib.format.open_memmap(filename, mode="w+", dtype=np.float32, shape=shape)
+        return np.load(filename, mmap_mode="r" if self._read_only else "r+")
+
+    def _read_meta(self):
+        return _read_json(os.path.join(self._path, "meta.json"))
+
+    def writable(self):
+        return not self._read_only
+
+    def add(self, state, action, reward, next_state, done=False):
+        assert not self._read_only
+        return super().add(state, action, reward, next_state, done)
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        assert not self._read_only
+        return super().add_batch(states, actions, rewards, next_states, dones)
+
+    def flush(self):
+        if self._read_only:
+            return
+        for name in self.FIELDS:
+            getattr(self, name).flush()
+        _write_json(os.path.join(self._path, "meta.json"), self._meta())
+
+    # The transitions already live on disk under the buffer's own path, so a
+    # checkpoint only records how far the ring had got. Transitions written
+    # after the checkpoint are valid ones and simply get overwritten later.
+    def _arrays(self):
+        return {}
+
+    def snapshot(self):
+        self.flush()
+        return super().snapshot()
+
+    def save(self, path, snapshot=None):
+        if snapshot is None:
+            self.flush()
+        super().save(path, snapshot)
+
+    def load(self, path):
+        meta = _read_json(os.path.join(path, "meta.json"))
+        self._check_meta(meta)
+        if not self._read_only:
+            self._index = meta["index"]
+            self._size = meta["size"]
+            self.flush()
+        return meta
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    # Proportional prioritized replay: transitions are sampled with probability
+    # p^alpha / sum(p^alpha), where p is the last TD error seen for them, and the
+    # bias is corrected with importance-sampling weights annealed by beta.
+    def __init__(
+            self, capacity, state_size, action_size,
+            alpha=0.6, beta=0.4, beta_increment=1e-5, epsilon=1e-6
+    ):
+        super().__init__(capacity, state_size, action_size)
+
+        self._alpha = alpha
+        self._beta = beta
+        self._beta_increment = beta_increment
+        self._epsilon = epsilon
+        self._max_priority = 1.0
+        self._tree = SumTree(capacity)
+
+    def add(self, state, action, reward, next_state, done=False):
+        i = super().add(state, action, reward, next_state, done)
+        # New transitions get the highest priority so they are replayed at least once.
+        self._tree.update([i], [self._max_priority ** self._alpha])
+        return i
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        indices = super().add_batch(states, actions, rewards, next_states, dones)
+        self._tree.update(indices, np.full(len(indices), self._max_priority ** self._alpha))
+        return indices
+
+    def sample_indices(self, batch_size):
+        # Stratified sampling: one value from each of batch_size equal segments.
+        total = self._tree.total()
+        segment = total / batch_size
+        values = (np.arange(batch_size) + np.random.uniform(size=batch_size)) * segment
+        values = np.minimum(values, np.nextafter(total, 0))
+        return np.minimum(self._tree.find(values), self._size - 1)
+
+    def sample_weighted(self, batch_size, batches=1):
+        # batches consecutive batches of batch_size rows in one draw. The
+        # strata are dealt out round-robin, so every batch spans the whole
+        # priority mass instead of one index-ordered slice of it, and the
+        # importance weights are normalised within each batch. beta anneals
+        # once per batch.
+        indices = self.sample_indices(batch_size * batches)
+        indices = indices.reshape(batch_size, batches).T.reshape(-1)
+
+        probabilities = self._tree.get(indices) / self._tree.total()
+        weights = np.power(self._size * probabilities, -self._beta).reshape(batches, batch_size)
+        weights = (weights / weights.max(axis=1, keepdims=True)).astype(np.float32).reshape(-1, 1)
+        self._beta = min(1.0, self._beta + batches * self._beta_increment)
+
+        return self.gather(indices), indices, weights
+
+    def _meta(self):
+        meta = super()._meta()
+        meta["max_priority"] = float(self._max_priority)
+        meta["beta"] = float(self._beta)
+        return meta
+
+    def _arrays(self):
+        arrays = super()._arrays()
+        arrays["priorities"] = self._tree.get(np.arange(self._size))
+        return arrays
+
+    def load(self, path):
+        meta = super().load(path)
+        self._tree.update(np.arange(self._size), np.load(os.path.join(path, "priorities.npy")))
+        self._max_priority = meta["max_priority"]
+        self._beta = meta["beta"]
+        return meta
+
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(np.ravel(td_errors)) + self._epsilon
+        self._max_priority = max(self._max_priority, priorities.max())
+        self._tree.update(indices, np.power(priorities, self._alpha))
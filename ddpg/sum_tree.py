@@ -0,0 +1,39 @@
+import numpy as np
+
+
+class SumTree:
+    # Binary tree stored in a flat array: node i has children 2i and 2i + 1,
+    # the root is at index 1 and the leaves occupy [capacity, 2 * capacity).
+    # Every operation is done level by level for a whole batch of indices.
+    def __init__(self, capacity):
+        assert capacity > 0
+
+        self._capacity = 1
+        while self._capacity < capacity:
+            self._capacity *= 2
+        self._depth = self._capacity.bit_length() - 1
+        self._tree = np.zeros(2 * self._capacity, dtype=np.float64)
+
+    def total(self):
+        return self._tree[1]
+
+    def get(self, indices):
+        return self._tree[np.asarray(indices) + self._capacity]
+
+    def update(self, indices, priorities):
+        nodes = np.asarray(indices, dtype=np.int64) + self._capacity
+        self._tree[nodes] = priorities
+        for _ in range(self._depth):
+            nodes = np.unique(nodes // 2)
+            self._tree[nodes] = self._tree[2 * nodes] + self._tree[2 * nodes + 1]
+
+    def find(self, values):
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self._depth):
+            left = 2 * nodes
+            left_sum = self._tree[left]
+            right = values >= left_sum
+            values -= left_sum * right
+            nodes = left + right
+        return nodes - self._capacity
@@ -0,0 +1,316 @@
+import os
+import json
+import queue
+import argparse
+import itertools
+import numpy as np
+import multiprocessing as mp
+
+
+# Hyperparameter sweeps: grid or random search over SPACE, every trial a
+# headless Trainer run in a pool of worker processes. Each worker pins
+# TensorFlow to threads_per_trial threads so that the pool, sized to the
+# machine, does not oversubscribe the cores. Finished trials are appended to
+# one results store; trials already in it are skipped, so an interrupted
+# sweep continues where it stopped.
+# Run as: python3 -m ddpg.sweep --search random --trials 16 --episodes 300
+#
+# With --asha the configurations are scheduled by asynchronous successive
+# halving instead: every trial first trains for --min-episodes, and only the
+# best 1/eta of a rung are continued, from their checkpoint, to eta times as
+# many episodes, up to --episodes.
+# Run as: python3 -m ddpg.sweep --asha --trials 27 --min-episodes 100 --episodes 900
+
+# A list is searched as is; Uniform and LogUniform are only for random search.
+class Uniform:
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def sample(self, rng):
+        return float(rng.uniform(self.low, self.high))
+
+
+class LogUniform(Uniform):
+    def sample(self, rng):
+        return float(np.exp(rng.uniform(np.log(self.low), np.log(self.high))))
+
+
+SPACE = {
+    "tau": [0.005, 0.01, 0.02],
+    "gamma": [0.95, 0.97, 0.99],
+    "batch_size": [64, 128, 256],
+    "actor_layers": [(64, 32), (128, 32), (128, 64)],
+    "critic_layers": [(64, 32), (128, 32), (128, 64)],
+    "actor_lr": [0.0001, 0.0002, 0.0005],
+    "critic_lr": [0.0002, 0.0003, 0.001],
+}
+
+# Trainer arguments shared by every trial.
+BASE = {
+    "episodes": 300,
+    "memory_size": 65536,
+}
+
+
+def grid(space=SPACE):
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def random_search(count, space=SPACE, seed=0):
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(count):
+        config = {}
+        for (name, values) in space.items():
+            if isinstance(values, Uniform):
+                config[name] = values.sample(rng)
+            else:
+                config[name] = values[rng.integers(len(values))]
+        configs.append(config)
+    return configs
+
+
+class ResultsStore:
+    # JSON lines, one record per finished trial: its config, the Trainer
+    # arguments, a summary and the per-episode rewards.
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def add(self, record):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def records(self):
+        if not os.path.isfile(self.path):
+            return []
+        with open(self.path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def best(self, key="final_reward", count=1):
+        # The last record of every config, i.e. its highest rung under ASHA.
+        latest = {json.dumps(record["config"]): record for record in self.records()}
+        records = [record for record in latest.values() if record["summary"].get(key) is not None]
+        return sorted(records, key=lambda record: record["summary"][key], reverse=True)[:count]
+
+
+def _normalize(config):
+    # JSON turns tuples into lists; compare configs the way they are stored.
+    return json.loads(json.dumps(config))
+
+
+def summarize(rewards, window=100):
+    rewards = np.asarray(rewards)
+    window = min(window, len(rewards))
+    rolling = np.convolve(rewards, np.ones(window) / window, mode="valid")
+    return {
+        "episodes": len(rewards),
+        "final_reward": float(rewards[-window:].mean()),
+        "best_rolling_reward": float(rolling.max()),
+        "max_reward": float(rewards.max()),
+    }
+
+
+def init_worker(threads):
+    # Has to run before TensorFlow creates its thread pools, i.e. before any
+    # op: sweep pools use it as the initializer, PBT members call it first.
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def run_trial(trial, config, base, budget=None, checkpoint_path=None):
+    # With a budget, trains until that episode, continuing from the trial's
+    # checkpoint if there is one and leaving a new one behind.
+    from .trainer import Trainer
+
+    trainer = Trainer(**base, **config)
+    if checkpoint_path is not None:
+        trainer.load_checkpoint(checkpoint_path)
+    metrics = trainer.run(until=budget)
+    if checkpoint_path is not None:
+        trainer.save_checkpoint(checkpoint_path)
+    rewards = metrics["rewards"][:trainer.episode]
+
+    return {
+        "trial": trial,
+        "config": _normalize(config),
+        "base": _normalize(base),
+        "summary": dict(summarize(rewards), stopped=trainer.stop_reason, **trainer.stats),
+        "rewards": rewards.tolist(),
+    }
+
+
+def _run_trial(arguments):
+    return run_trial(*arguments)
+
+
+def sweep(configs, results, base=BASE, threads_per_trial=1, processes=None, context="spawn"):
+    store = ResultsStore(results)
+    done = [record["config"] for record in store.records()]
+    trials = [(i, config) for (i, config) in enumerate(configs) if _normalize(config) not in done]
+    if not trials:
+        return store
+
+    if processes is None:
+        processes = max(1, (os.cpu_count() or 1) // threads_per_trial)
+    processes = min(processes, len(trials))
+
+    with mp.get_context(context).Pool(processes, init_worker, (threads_per_trial,)) as pool:
+        # Stored as they finish, so an interruption loses only running trials.
+        for record in pool.imap_unordered(_run_trial, [(i, config, base) for (i, config) in trials]):
+            store.add(record)
+            summary = record["summary"]
+            print(f"~~~~~ Trial {record['trial']}: final reward {summary['final_reward']:.1f}; {record['config']}")
+    return store
+
+
+def rungs(min_episodes, max_episodes, eta=3):
+    # Episode budgets: min_episodes, eta times that, ..., max_episodes.
+    assert 0 < min_episodes <= max_episodes
+    assert eta > 1
+    budgets = []
+    budget = min_episodes
+    while budget < max_episodes:
+        budgets.append(budget)
+        budget *= eta
+    return budgets + [max_episodes]
+
+
+class ASHA:
+    # Asynchronous successive halving. Whenever a worker is free, the trial
+    # in the highest rung that is among the best 1/eta of the results there
+    # and not yet promoted moves up one rung; otherwise the next config starts
+    # in the lowest rung. Nothing waits for a rung to fill, and the rest of
+    # each rung is never continued. Trials that stopped early (converged or
+    # stalled) are not promoted.
+    def __init__(self, configs, budgets, eta=3, key="final_reward"):
+        self.configs = [_normalize(config) for config in configs]
+        self.budgets = budgets
+        self.eta = eta
+        self.key = key
+        self.results = [{} for _ in budgets]
+        self.promoted = [set() for _ in budgets]
+        self._next = 0
+
+    def add(self, record):
+        (trial, rung) = (record["trial"], record["rung"])
+        self.results[rung][trial] = record
+        if rung > 0:
+            self.promoted[rung - 1].add(trial)
+
+    def _promotion(self, rung):
+        results = self.results[rung]
+        ranked = sorted(results.values(), key=lambda record: record["summary"][self.key], reverse=True)
+        for record in ranked[:len(results) // self.eta]:
+            if record["trial"] not in self.promoted[rung] and record["summary"]["stopped"] is None:
+                return record["trial"]
+        return None
+
+    def next_job(self):
+        # (trial, rung) to run next, or None when nothing can run right now.
+        for rung in reversed(range(len(self.budgets) - 1)):
+            trial = self._promotion(rung)
+            if trial is not None:
+                self.promoted[rung].add(trial)
+                return (trial, rung + 1)
+        while self._next < len(self.configs):
+            trial = self._next
+            self._next += 1
+            if trial not in self.results[0]:
+                return (trial, 0)
+        return None
+
+
+def asha(
+        configs, results, checkpoints, base=BASE, min_episodes=100, eta=3,
+        threads_per_trial=1, processes=None, context="spawn"
+):
+    # Records carry their rung and its episode budget; the ones already in
+    # the store (for the same configs) are taken over, so an interrupted
+    # sweep continues. Each trial keeps one checkpoint, under checkpoints.
+    budgets = rungs(min_episodes, base["episodes"], eta)
+    scheduler = ASHA(configs, budgets, eta)
+    store = ResultsStore(results)
+    for record in store.records():
+        if "rung" in record and scheduler.configs[record["trial"]:record["trial"] + 1] == [record["config"]]:
+            scheduler.add(record)
+
+    if processes is None:
+        processes = max(1, (os.cpu_count() or 1) // threads_per_trial)
+
+    finished = queue.Queue()
+    running = 0
+    with mp.get_context(context).Pool(processes, init_worker, (threads_per_trial,)) as pool:
+        while True:
+            while running < processes:
+                job = scheduler.next_job()
+                if job is None:
+                    break
+                (trial, rung) = job
+                path = os.path.join(checkpoints, f"trial-{trial}")
+                arguments = (trial, configs[trial], base, budgets[rung], path)
+                pool.apply_async(
+                    run_trial, arguments,
+                    callback=lambda record, rung=rung: finished.put(dict(record, rung=rung, episodes=budgets[rung])),
+                    error_callback=finished.put
+                )
+                running += 1
+            if running == 0:
+                return store
+
+            record = finished.get()
+            running -= 1
+            if isinstance(record, BaseException):
+                raise record
+            store.add(record)
+            scheduler.add(record)
+            summary = record["summary"]
+            print(
+                f"~~~~~ Trial {record['trial']}, rung {record['rung']} ({summary['episodes']} episodes): "
+                f"final reward {summary['final_reward']:.1f}; {record['config']}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a hyperparameter sweep over SPACE.")
+    parser.add_argument("--search", choices=("grid", "random"), default="random")
+    parser.add_argument("--trials", type=int, default=16, help="number of random configurations")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--episodes", type=int, default=BASE["episodes"])
+    parser.add_argument("--threads", type=int, default=1, help="TensorFlow threads per trial")
+    parser.add_argument("--processes", type=int, help="parallel trials, cores / threads by default")
+    parser.add_argument("--results", default="sweep-results.jsonl")
+    parser.add_argument("--asha", action="store_true", help="schedule by asynchronous successive halving")
+    parser.add_argument("--min-episodes", type=int, default=100, help="episodes in the lowest ASHA rung")
+    parser.add_argument("--eta", type=int, default=3, help="ASHA keeps the best 1/eta of every rung")
+    parser.add_argument("--checkpoints", default="sweep-checkpoints", help="ASHA trial checkpoints")
+    parser.add_argument("--stop-reward", type=float, help="end trials early once the rolling reward holds this")
+    parser.add_argument("--stall-patience", type=int, help="end trials whose rolling reward stops improving")
+    arguments = parser.parse_args()
+
+    if arguments.search == "grid":
+        configs = grid()
+    else:
+        configs = random_search(arguments.trials, seed=arguments.seed)
+    base = dict(
+        BASE, episodes=arguments.episodes,
+        stop_reward=arguments.stop_reward, stall_patience=arguments.stall_patience
+    )
+
+    if arguments.asha:
+        store = asha(
+            configs, arguments.results, arguments.checkpoints, base, arguments.min_episodes,
+            arguments.eta, arguments.threads, arguments.processes
+        )
+    else:
+        store = sweep(configs, arguments.results, base, arguments.threads, arguments.processes)
+    for record in store.best(count=3):
+        print(f"~~~~~ Best: {record['summary']['final_reward']:.1f}; {record['config']}")
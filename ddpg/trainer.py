@@ -0,0 +1,386 @@
+import time
+import numpy as np
+from . import checkpoint
+from .async_learner import AsyncLearner
+from .background_writer import BackgroundWriter, append_row
+from .ddpg import DDPG
+from .early_stopping import EarlyStopping
+from env.clock import SimClock
+from env.scenery import Scenery
+from util.flags import TRACE
+
+
+# ~  Constants
+MAX_STEPS = 500
+EPISODES = 2000
+MEMORY_SIZE = 65536
+SIM_DT = 0.02    # s, fixed physics step; None uses the measured wall time
+
+
+class Trainer:
+    def __init__(
+            self, max_steps=MAX_STEPS, episodes=EPISODES, memory_size=MEMORY_SIZE,
+            seed=1, tau=0.01, gamma=0.97, batch_size=256,
+            noise_decay=None, my_ou=0,
+            actor_layers=(128, 32), critic_layers=(128, 32),
+            actor_lr=0.0002, critic_lr=0.0003,
+            repetitions=1, sim_dt=SIM_DT, realtime=False, surface=None,
+            memory_path=None, memory_read_only=False, prioritized=False,
+            eager=False, jit_compile=False,
+            numpy_actor=False, numpy_actor_refresh=1,
+            async_learner=False, publish_interval=100, max_steps_per_update=4,
+            updates_per_step=1,
+            target_update_interval=1, checkpoint_path=None,
+            checkpoint_interval=100, checkpoint_keep=3, metrics_path=None,
+            stop_reward=None, stop_window=100, stop_patience=100, stall_patience=None
+    ):
+        assert episodes > 0
+        assert repetitions > 0
+        assert checkpoint_interval > 0
+        # Early stopping looks at one run's rewards, not sums over repetitions.
+        assert repetitions == 1 or (stop_reward is None and stall_patience is None)
+
+        self.max_steps = max_steps
+        self.episodes = episodes
+        self.memory_size = memory_size
+        self.repetitions = repetitions
+        self.async_learner = async_learner
+        # The asynchronous learner holds the acting loop back while it is
+        # more than max_steps_per_update env steps per update behind; None
+        # lets acting run free. 1 keeps the two in lock-step (acting only
+        # ever pipelines a single step); the default of 4 lets acting run
+        # ahead at the cost of fewer updates per transition.
+        self.max_steps_per_update = max_steps_per_update
+        # Checkpoints every checkpoint_interval episodes and at the end of a
+        # run, into numbered directories of which the last checkpoint_keep
+        # are kept, and one CSV row per episode, all written in the background.
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_keep = checkpoint_keep
+        self.metrics_path = metrics_path
+        self.hyperparameters = dict(
+            seed=seed,
+            tau=tau,
+            gamma=gamma,
+            batch_size=batch_size,
+            noise_decay=episodes if noise_decay is None else noise_decay,
+            my_ou=my_ou,    # 0 - Gauss, 1 - My OU, 2 - tf-agents OU
+            actor_layers=list(actor_layers),
+            critic_layers=list(critic_layers),
+            actor_lr=actor_lr,
+            critic_lr=critic_lr,
+            memory_path=memory_path,
+            memory_read_only=memory_read_only,
+            prioritized=prioritized,
+            eager=eager,
+            jit_compile=jit_compile,
+            # The asynchronous learner publishes actor weights to the acting
+            # side through the NumPy actor every publish_interval actor updates.
+            numpy_actor=numpy_actor or async_learner,
+            numpy_actor_refresh=publish_interval if async_learner else numpy_actor_refresh,
+            updates_per_step=updates_per_step,
+            target_update_interval=target_update_interval
+        )
+
+        self.clock = SimClock(sim_dt, realtime=realtime)
+        self.scenery = Scenery(max_steps, surface)
+        self.agent = self.new_agent()
+
+        # Metrics, summed over repetitions like the original script did.
+        self.metrics = {
+            "rewards": np.zeros(episodes),
+            "reward_step": np.zeros(episodes),
+            "pos_avg": np.zeros(episodes),
+            "angle_avg": np.zeros(episodes),
+        }
+
+        self._step_hooks = []
+        self._episode_hooks = []
+        self._stop = False
+        self._learner = None
+        self._writer = None
+        self._start_time = None
+
+        # Ends the run once the rolling reward has held stop_reward for
+        # stop_patience episodes, or has not improved for stall_patience.
+        self.stop_reason = None
+        if stop_reward is not None or stall_patience is not None:
+            self.add_episode_hook(EarlyStopping(
+                np.inf if stop_reward is None else stop_reward,
+                stop_window, stop_patience, stall_patience
+            ))
+
+        # Throughput of acting and learning, reported separately.
+        self.stats = {
+            "steps": 0,
+            "updates": 0,
+            "seconds": 0.0,
+            "steps_per_second": 0.0,
+            "updates_per_second": 0.0,
+            "updates_per_step": 0.0,
+        }
+
+        self.repetition = 0
+        self.episode = 0
+        self.episode_steps = 0
+        self.state = None
+        self._reset_episode()
+
+    def new_agent(self):
+        return DDPG(
+            num_inputs=4,
+            num_outputs=1,
+            memory_size=self.memory_size,
+            **self.hyperparameters
+        )
+
+    def load_weights(self, filename):
+        return self.agent.load_weights(filename)
+
+    def save_weights(self, filename):
+        self.agent.save_weights(filename)
+
+    # Checkpoints hold the agent (see DDPG.save_checkpoint) together with the
+    # metrics and the progress of the run. A run resumed from one restarts
+    # the episode that was in progress.
+    def save_checkpoint(self, path):
+        checkpoint.write(path, self._checkpoint_writer())
+
+    def snapshot(self):
+        # The asynchronous learner is paused while copying so that the
+        # networks, optimizer state and memory are taken at the same update.
+        learning = self._learner is not None
+        self._stop_learner()
+        stats = dict(self.stats)
+        if self._start_time is not None:
+            stats["seconds"] += time.perf_counter() - self._start_time
+        snapshot = {
+            "agent": self.agent.snapshot(),
+            "trainer": {
+                "metrics": {name: values.copy() for (name, values) in self.metrics.items()},
+                "stats": stats,
+                "repetition": self.repetition,
+                "episode": self.episode,
+            },
+        }
+        if learning:
+            self._start_learner()
+        return snapshot
+
+    def load_checkpoint(self, path):
+        path = checkpoint.find(path)
+        if path is None:
+            return False
+        self.agent._read_checkpoint(path)
+        state = checkpoint.load_state(path, "trainer")
+        for (name, values) in state["metrics"].items():
+            self.metrics[name][:] = values
+        self.stats.update(state["stats"])
+        self.repetition = state["repetition"]
+        self.episode = state["episode"]
+        self._reset_episode()
+        return True
+
+    def _checkpoint_writer(self):
+        # Takes the snapshot now and returns the function that writes it. The
+        # agent is bound here, as a queued write may only run after the next
+        # repetition has replaced it.
+        snapshot = self.snapshot()
+        agent = self.agent
+
+        def write(directory):
+            agent._write_checkpoint(directory, snapshot["agent"])
+            checkpoint.save_state(directory, "trainer", snapshot["trainer"])
+        return write
+
+    def _submit_checkpoint(self):
+        number = self.repetition * self.episodes + self.episode
+        self._writer.submit(
+            checkpoint.write_numbered, self.checkpoint_path, number,
+            self._checkpoint_writer(), self.checkpoint_keep
+        )
+
+    # Called as hook(trainer, action, reward, terminated) after every step.
+    def add_step_hook(self, hook):
+        self._step_hooks.append(hook)
+
+    # Called as hook(trainer, episode, reward, steps) after every episode.
+    def add_episode_hook(self, hook):
+        self._episode_hooks.append(hook)
+
+    def stop(self):
+        self._stop = True
+
+    def _reset_episode(self):
+        self.episode_steps = 0
+        self._ep_reward = 0
+        self._ep_pos = 0
+        self._ep_angle = 0
+        self.scenery.reset()
+        self.state = self.scenery.get_current_state()
+
+    def fill_memory(self):
+        i = 0
+        print("~~~~~ Filling memory")
+        while self.agent._memory.writable() and len(self.agent._memory) < self.memory_size:
+            dt = self.clock.tick()
+            action = self.agent.action(self.state, i)
+            self.scenery._action += action[0]
+            self.scenery.tick(dt, self.episode_steps)
+            self.state, reward, terminated = self.scenery.post_tick(self.episode_steps, action)
+            self.agent.feed(action, reward, self.state, terminated)
+
+            self.episode_steps += 1
+            if terminated:
+                i += 1
+                self._reset_episode()
+
+        self._reset_episode()
+        self.agent._memory.flush()
+        print(f"~~~~~ Memory filled: {len(self.agent._memory)}")
+
+    def step(self):
+        dt = self.clock.tick()
+        action = self.agent.action(self.state, self.episode)
+
+        self.scenery._apply_action(action[0])
+        self.scenery.tick(dt, self.episode_steps)
+        self.state, step_reward, terminated = self.scenery.post_tick(self.episode_steps, action)
+
+        self.agent.feed(action, step_reward, self.state, terminated)
+        if not self.async_learner:
+            self.stats["updates"] += self.agent.train()
+        elif self._learner is not None:
+            self._learner.acted()
+        self.stats["steps"] += 1
+
+        self._ep_reward += step_reward
+        self._ep_pos += self.state[0]
+        self._ep_angle += self.state[2]
+        self.episode_steps += 1
+
+        if TRACE:
+            print(f"~~~~~ Action to apply   : {action}")
+            print(f"~~~~~ Episode reward    : {self._ep_reward}")
+            print(f"~~~~~ Action post apply : {self.scenery._action}")
+            print(f"~~~~~ State after tick  : {self.state}")
+
+        for hook in self._step_hooks:
+            hook(self, action, step_reward, terminated)
+
+        if terminated:
+            self._end_episode()
+
+        return terminated
+
+    def _end_episode(self):
+        episode = self.episode
+        steps = self.episode_steps
+        reward = self._ep_reward
+
+        row = {
+            "repetition": self.repetition,
+            "episode": episode,
+            "steps": steps,
+            "rewards": reward,
+            "reward_step": reward / steps,
+            "pos_avg": self._ep_pos / steps,
+            "angle_avg": self._ep_angle / steps,
+        }
+        for name in self.metrics:
+            self.metrics[name][episode] += row[name]
+
+        self.episode += 1
+        self._reset_episode()
+
+        for hook in self._episode_hooks:
+            hook(self, episode, reward, steps)
+
+        if self._writer is not None:
+            if self.metrics_path is not None:
+                self._writer.submit(append_row, self.metrics_path, row)
+            if self.checkpoint_path is not None and self.episode % self.checkpoint_interval == 0:
+                self._submit_checkpoint()
+
+    def _start_learner(self):
+        if self.async_learner:
+            self._learner = AsyncLearner(self.agent, max_steps_per_update=self.max_steps_per_update)
+            self._learner.start()
+
+    def _stop_learner(self):
+        if self._learner is not None:
+            try:
+                self._learner.stop()
+            finally:
+                self.stats["updates"] += self._learner.updates
+                self._learner = None
+
+    def _start_writer(self):
+        if self.checkpoint_path is not None or self.metrics_path is not None:
+            self._writer = BackgroundWriter()
+            self._writer.start()
+
+    def _stop_writer(self):
+        if self._writer is not None:
+            if self.checkpoint_path is not None:
+                self._submit_checkpoint()
+            self._writer.stop()
+            self._writer = None
+
+    def _finish(self):
+        # Also runs when the loop raised (a hook, a learner failure or a
+        # KeyboardInterrupt): the learner is stopped, queued checkpoints and
+        # metric rows are written along with a final checkpoint, and the
+        # memory is flushed. A failure in one step does not skip the others.
+        try:
+            self._stop_learner()
+        finally:
+            try:
+                self._stop_writer()
+            finally:
+                self.agent._memory.flush()
+                seconds = time.perf_counter() - self._start_time
+                self._start_time = None
+                self.stats["seconds"] += seconds
+                self.stats["steps_per_second"] = self.stats["steps"] / self.stats["seconds"]
+                self.stats["updates_per_second"] = self.stats["updates"] / self.stats["seconds"]
+                self.stats["updates_per_step"] = self.stats["updates"] / max(1, self.stats["steps"])
+
+    # With until, returns once until episodes of the current repetition are
+    # done; a later run() continues from there.
+    def run(self, until=None):
+        self._stop = False
+        self._start_time = time.perf_counter()
+        try:
+            self._start_writer()
+            self._start_learner()
+            while not self._stop:
+                if until is not None and self.episode >= until:
+                    break
+                # Checked before stepping, so that a run resumed from a checkpoint
+                # taken after the last episode moves on to the next repetition.
+                if self.episode >= self.episodes:
+                    if self.repetition + 1 >= self.repetitions:
+                        break
+                    self.repetition += 1
+
+                    print(f"~~~~~ Repetition {self.repetition}")
+                    self._stop_learner()
+                    self.agent = self.new_agent()
+                    self.episode = 0
+                    self._start_learner()
+
+                self.step()
+        finally:
+            self._finish()
+
+        print(
+            f"~~~~~ Steps/s: {self.stats['steps_per_second']:.1f}; Updates/s: {self.stats['updates_per_second']:.1f}; "
+            f"Updates/step: {self.stats['updates_per_step']:.2f}"
+        )
+
+        return self.metrics
+
+
+def train(**kwargs):
+    return Trainer(**kwargs).run()
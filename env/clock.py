@@ -0,0 +1,36 @@
+import time
+
+
+class SimClock:
+    # Hands out the simulation time step. With a fixed dt the physics no longer
+    # depend on wall-clock jitter; realtime only paces the loop to that dt for
+    # watching, otherwise the simulation runs as fast as possible.
+    # dt=None falls back to measuring wall time between ticks.
+    def __init__(self, dt=0.02, realtime=False):
+        assert dt is None or dt > 0
+
+        self._dt = dt
+        self._realtime = realtime
+        self._last = time.perf_counter()
+        self.frame_time = 0.0
+        self.sim_time = 0.0
+        self.ticks = 0
+
+    def is_fixed(self):
+        return self._dt is not None
+
+    def tick(self):
+        now = time.perf_counter()
+        if self._dt is None:
+            dt = now - self._last if self.ticks > 0 else 0.0
+        else:
+            dt = self._dt
+            if self._realtime and now - self._last < dt:
+                time.sleep(dt - (now - self._last))
+                now = time.perf_counter()
+
+        self.frame_time = now - self._last
+        self._last = now
+        self.sim_time += dt
+        self.ticks += 1
+        return dt
@@ -0,0 +1,121 @@
+import numpy as np
+import gymnasium
+from gymnasium import spaces
+from gymnasium.utils import seeding
+from gymnasium.vector import VectorEnv, AutoresetMode
+from gymnasium.vector.utils import batch_space
+from .scenery import Scenery
+from .vector_scenery import VectorScenery
+
+
+# Gymnasium front-ends for the custom cart-pole. Importing this module
+# registers "CartPoleDDPG-v0", usable with gymnasium.make and with
+# gymnasium.make_vec(..., vectorization_mode="vector_entry_point").
+
+MAX_STEPS = 500
+DT = 0.02
+
+OBSERVATION_SPACE = spaces.Box(-np.inf, np.inf, shape=(4,), dtype=np.float32)
+ACTION_SPACE = spaces.Box(-1.0, 1.0, shape=(1,), dtype=np.float32)
+
+
+class CartPoleEnv(gymnasium.Env):
+    metadata = {"render_modes": []}
+
+    # init_noise is the half-width of a uniform perturbation of the initial
+    # (position, speed, angle, angular speed), a scalar or one value each;
+    # angles are in degrees like everywhere else in the simulator.
+    def __init__(self, max_steps=MAX_STEPS, dt=DT, init_noise=0.0):
+        self.observation_space = OBSERVATION_SPACE
+        self.action_space = ACTION_SPACE
+
+        self.scenery = Scenery(max_steps)
+        self._max_steps = max_steps
+        self._dt = dt
+        self._init_noise = np.broadcast_to(np.asarray(init_noise, dtype=np.float64), (4,))
+        self._steps = 0
+
+    def _observation(self):
+        return np.asarray(self.scenery.get_current_state(), dtype=np.float32)
+
+    def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
+        self.scenery.reset()
+        self._steps = 0
+
+        if self._init_noise.any():
+            x, speed, theta, theta_speed = self.np_random.uniform(-self._init_noise, self._init_noise)
+            cart = self.scenery._cart
+            cart.position = (x, 0.0)
+            cart.speed = speed
+            cart.theta = theta
+            cart.theta_speed = theta_speed
+
+        return self._observation(), {}
+
+    def step(self, action):
+        self.scenery._apply_action(float(action[0]))
+        self.scenery.tick(self._dt, self._steps)
+        state, reward, terminated = self.scenery.post_tick(self._steps, action)
+
+        cart = self.scenery._cart
+        failed = abs(state[0]) > cart.position_range or abs(state[2]) > cart.theta_threshold
+        truncated = terminated and not failed
+        self._steps += 1
+
+        return self._observation(), reward, failed, truncated, {}
+
+
+class CartPoleVectorEnv(VectorEnv):
+    # Steps all environments in one VectorScenery call. Finished environments
+    # are reset within the same step; their last observation is returned in
+    # info["final_obs"], masked by info["_final_obs"].
+    metadata = {"render_modes": [], "autoreset_mode": AutoresetMode.SAME_STEP}
+
+    def __init__(self, num_envs, max_steps=MAX_STEPS, dt=DT, init_noise=0.0):
+        self.num_envs = num_envs
+        self.single_observation_space = OBSERVATION_SPACE
+        self.single_action_space = ACTION_SPACE
+        self.observation_space = batch_space(OBSERVATION_SPACE, num_envs)
+        self.action_space = batch_space(ACTION_SPACE, num_envs)
+
+        self.scenery = VectorScenery(num_envs, max_steps)
+        self._dt = dt
+        self._init_noise = np.broadcast_to(np.asarray(init_noise, dtype=np.float64), (4,))
+        self._rng, _ = seeding.np_random()
+
+    def reset(self, *, seed=None, options=None):
+        if seed is not None:
+            self._rng, _ = seeding.np_random(seed)
+
+        everything = np.ones(self.num_envs, dtype=bool)
+        self.scenery.reset()
+        self.scenery.randomize(everything, self._init_noise, self._rng)
+        return self.scenery.get_current_state().astype(np.float32), {}
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.float64).reshape(self.num_envs, -1)
+        self.scenery._apply_action(actions[:, 0])
+        self.scenery.tick(self._dt)
+        states, rewards, terminated, truncated = self.scenery.post_tick()
+        self.scenery.randomize(terminated, self._init_noise, self._rng)
+
+        info = {}
+        if terminated.any():
+            info["final_obs"] = states.astype(np.float32)
+            info["_final_obs"] = terminated.copy()
+
+        return (
+            self.scenery.get_current_state().astype(np.float32),
+            rewards,
+            terminated & ~truncated,
+            truncated.copy(),
+            info
+        )
+
+
+gymnasium.register(
+    id="CartPoleDDPG-v0",
+    entry_point="env.gym_env:CartPoleEnv",
+    vector_entry_point="env.gym_env:CartPoleVectorEnv",
+)
@@ -3,10 +3,8 @@ import struct
 import copy
 import glob
 import subprocess
-import pygame
 import numpy as np
 import math
-from .canvas import Canvas
 from .cart import Cart
 from util.flags import TRACE
 
@@ -29,9 +27,13 @@ class Scenery:
     _start_time = 0
     _max_ang_velo = 0.1
 
-    def __init__(self, max_steps, surface):
-        self._canvas = Canvas(surface)
-        self._canvas.set_vertical_offset_at(7.0 / 8.0)
+    def __init__(self, max_steps, surface=None):
+        # Without a surface the scenery is headless: only the physics run and
+        # neither pygame nor the canvas are ever imported.
+        if surface is not None:
+            from .canvas import Canvas
+            self._canvas = Canvas(surface)
+            self._canvas.set_vertical_offset_at(7.0 / 8.0)
         self._cart = Cart(max_steps)
         self._max_steps = max_steps
 
@@ -43,6 +45,9 @@ class Scenery:
     def get_current_state(self):
         return self._cart.get_current_state()
 
+    def is_headless(self):
+        return self._canvas is None
+
     def sigmoid(self, x):
         return ( 1.0 / (1.0 + math.exp(-x)) )
 
@@ -155,6 +160,8 @@ class Scenery:
         active_canvas = canvas
         if active_canvas is None:
             active_canvas = self._canvas
+        if active_canvas is None:
+            return
 
         active_canvas.surface.fill((64, 128, 128))
         x0, y0 = active_canvas.to_canvas((0, 0))
@@ -175,6 +182,9 @@ class Scenery:
             active_canvas.draw_arrow((x0, y0), (x1, y1), (0, 0, 128), 0.02)
 
     def start_recording(self):
+        if self.is_headless():
+            return
+        import pygame
         self.stop_playing()
         self.stop_recording()
         self._data = bytes("", "utf-8")
@@ -191,6 +201,7 @@ class Scenery:
         self.save_frame()
 
     def save_frame(self):
+        import pygame
         time = float(pygame.time.get_ticks() - self._start_time) / 1000.0
         (x, y) = self._cart.position
         self._data += struct.pack("f", float(time))
@@ -218,6 +229,9 @@ class Scenery:
         return value, False
 
     def start_playing(self, filename):
+        if self.is_headless():
+            return
+        import pygame
         self.stop_playing()
         self.stop_recording()
         if not os.path.isfile(filename):
@@ -250,6 +264,7 @@ class Scenery:
 
     def load_frame(self, current_time=None):
         if current_time is None:
+            import pygame
             current_time = float(pygame.time.get_ticks() -
                                  self._start_time) / 1000.0
         frame_valid = False
@@ -294,8 +309,9 @@ class Scenery:
             self._cart.theta = theta
 
     def convert_recording(self, filename):
-        if not os.path.isfile(filename):
+        if self.is_headless() or not os.path.isfile(filename):
             return
+        import pygame
 
         try:
             subprocess.check_output("ffmpeg -version")
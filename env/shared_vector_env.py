@@ -0,0 +1,181 @@
+import os
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from .vector_scenery import VectorScenery
+
+
+MAX_STEPS = 500
+DT = 0.02
+
+# (shape after the environment axis, dtype) of every array shared with workers.
+FIELDS = {
+    "actions": ((1,), np.float64),
+    "observations": ((4,), np.float64),
+    "final_observations": ((4,), np.float64),
+    "rewards": ((), np.float64),
+    "terminated": ((), np.bool_),
+    "truncated": ((), np.bool_),
+}
+
+
+def _attach(names, num_envs):
+    blocks = {}
+    arrays = {}
+    for field, (shape, dtype) in FIELDS.items():
+        blocks[field] = shared_memory.SharedMemory(name=names[field])
+        arrays[field] = np.ndarray((num_envs,) + shape, dtype=dtype, buffer=blocks[field].buf)
+    return blocks, arrays
+
+
+def _worker(conn, names, num_envs, start, stop, max_steps, dt, init_noise):
+    blocks, arrays = _attach(names, num_envs)
+    # Each worker only ever touches its own [start, stop) slice.
+    own = {field: array[start:stop] for field, array in arrays.items()}
+
+    scenery = VectorScenery(stop - start, max_steps)
+    rng = np.random.default_rng()
+
+    try:
+        while True:
+            command, argument = conn.recv()
+            if command == "step":
+                scenery._apply_action(own["actions"][:, 0])
+                scenery.tick(dt)
+                states, rewards, terminated, truncated = scenery.post_tick()
+                scenery.randomize(terminated, init_noise, rng)
+
+                own["final_observations"][:] = states
+                own["rewards"][:] = rewards
+                own["terminated"][:] = terminated & ~truncated
+                own["truncated"][:] = truncated
+                own["observations"][:] = scenery.get_current_state()
+            elif command == "reset":
+                rng = np.random.default_rng(argument)
+                scenery.reset()
+                scenery.randomize(np.ones(stop - start, dtype=bool), init_noise, rng)
+                own["observations"][:] = scenery.get_current_state()
+            elif command == "close":
+                break
+            conn.send(None)
+    finally:
+        del own, arrays
+        for block in blocks.values():
+            block.close()
+        conn.close()
+
+
+class SharedMemoryVectorEnv:
+    # Runs num_envs cart-poles split over worker processes, each stepping its
+    # group with a VectorScenery. Actions, observations, rewards and done flags
+    # live in shared memory; the pipes only carry the step/reset commands.
+    # Same auto-reset semantics as env.gym_env.CartPoleVectorEnv.
+    def __init__(
+            self, num_envs, num_workers=None, max_steps=MAX_STEPS, dt=DT,
+            init_noise=0.0, context="spawn"
+    ):
+        if num_workers is None:
+            num_workers = os.cpu_count()
+        num_workers = max(1, min(num_workers, num_envs))
+
+        self.num_envs = num_envs
+        self.num_workers = num_workers
+        self._closed = False
+        self._waiting = False
+
+        self._blocks = {}
+        self._arrays = {}
+        for field, (shape, dtype) in FIELDS.items():
+            nbytes = max(1, int(np.prod((num_envs,) + shape)) * np.dtype(dtype).itemsize)
+            block = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._blocks[field] = block
+            self._arrays[field] = np.ndarray((num_envs,) + shape, dtype=dtype, buffer=block.buf)
+            self._arrays[field][:] = 0
+        names = {field: block.name for field, block in self._blocks.items()}
+
+        init_noise = np.broadcast_to(np.asarray(init_noise, dtype=np.float64), (4,)).copy()
+        bounds = np.linspace(0, num_envs, num_workers + 1).astype(int)
+
+        ctx = mp.get_context(context)
+        self._connections = []
+        self._processes = []
+        for i in range(num_workers):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker,
+                args=(child, names, num_envs, bounds[i], bounds[i + 1], max_steps, dt, init_noise),
+                daemon=True
+            )
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def _broadcast(self, command, arguments=None):
+        for i, conn in enumerate(self._connections):
+            conn.send((command, None if arguments is None else arguments[i]))
+
+    def _wait(self):
+        for conn in self._connections:
+            conn.recv()
+
+    def reset(self, seed=None):
+        assert not self._waiting
+        if seed is None:
+            seeds = None
+        else:
+            seeds = [seed + i for i in range(self.num_workers)]
+        self._broadcast("reset", seeds)
+        self._wait()
+        return self._arrays["observations"].astype(np.float32), {}
+
+    def step_async(self, actions):
+        assert not self._waiting
+        self._arrays["actions"][:] = np.asarray(actions, dtype=np.float64).reshape(self.num_envs, -1)
+        self._broadcast("step")
+        self._waiting = True
+
+    def step_wait(self):
+        assert self._waiting
+        self._wait()
+        self._waiting = False
+
+        done = self._arrays["terminated"] | self._arrays["truncated"]
+        info = {}
+        if done.any():
+            info["final_obs"] = self._arrays["final_observations"].astype(np.float32)
+            info["_final_obs"] = done
+
+        return (
+            self._arrays["observations"].astype(np.float32),
+            self._arrays["rewards"].copy(),
+            self._arrays["terminated"].copy(),
+            self._arrays["truncated"].copy(),
+            info
+        )
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self._closed:
+            return
+        if self._waiting:
+            self._wait()
+        self._broadcast("close")
+        for process in self._processes:
+            process.join()
+        for conn in self._connections:
+            conn.close()
+        self._arrays = {}
+        for block in self._blocks.values():
+            block.close()
+            block.unlink()
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,106 @@
+import numpy as np
+from .cart import Cart
+
+
+class VectorCart:
+    width = Cart.width
+    cart_weight = Cart.cart_weight
+    pole_weight = Cart.pole_weight
+    pole_length = Cart.pole_length
+    position_range = Cart.position_range
+    theta_threshold = Cart.theta_threshold
+    damping = Cart.damping
+    theta_damping = Cart.theta_damping
+
+    def __init__(self, num_envs, max_steps, auto_reset=True):
+        assert num_envs > 0
+
+        self.num_envs = num_envs
+        self._max_steps = max_steps
+        self._auto_reset = auto_reset
+
+        # Cart - state of every env lives in one contiguous array per quantity,
+        # angles are kept in degrees exactly like Cart does.
+        self.position = np.zeros(num_envs)
+        self.speed = np.zeros(num_envs)
+        self.acceleration = np.zeros(num_envs)
+        # Pole
+        self.theta = np.zeros(num_envs)
+        self.theta_speed = np.zeros(num_envs)
+        self.theta_acceleration = np.zeros(num_envs)
+
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+        self.terminated = np.zeros(num_envs, dtype=bool)
+        # Terminated only because max_steps ran out, not by failing.
+        self.truncated = np.zeros(num_envs, dtype=bool)
+        # State each env was in when it terminated, before the auto-reset.
+        self.final_state = np.zeros((num_envs, 4))
+
+    def get_current_state(self):
+        return np.stack(
+                (self.position, self.speed, self.theta, self.theta_speed),
+                axis=1
+                )
+
+    def set_state(self, state, mask=None):
+        if mask is None:
+            mask = slice(None)
+        state = np.asarray(state, dtype=np.float64)
+        self.position[mask] = state[..., 0]
+        self.speed[mask] = state[..., 1]
+        self.theta[mask] = state[..., 2]
+        self.theta_speed[mask] = state[..., 3]
+
+    def reset(self, mask=None):
+        if mask is None:
+            mask = slice(None)
+        self.position[mask] = 0.0
+        self.speed[mask] = 0.0
+        self.acceleration[mask] = 0.0
+        self.theta[mask] = 0.0
+        self.theta_speed[mask] = 0.0
+        self.theta_acceleration[mask] = 0.0
+        self.steps[mask] = 0
+        self.terminated[mask] = False
+        self.truncated[mask] = False
+
+    def tick(self, f, g, dt):
+        rad = np.radians(self.theta)
+        sin = np.sin(rad)
+        cos = np.cos(rad)
+        theta_speed_rad = np.radians(self.theta_speed)
+
+        a = self.pole_weight * self.pole_length * np.square(theta_speed_rad) * sin
+        b = self.pole_weight * g * sin * cos
+        c = self.cart_weight + self.pole_weight - self.pole_weight * cos * cos
+        self.acceleration = (f - a + b) / c - self.damping * self.speed
+        self.speed += self.acceleration * dt
+        self.position += self.speed * dt
+
+        a = self.acceleration / self.pole_length * cos
+        b = g / self.pole_length * sin
+        self.theta_acceleration = (
+            np.degrees(a + b) - self.theta_damping * self.theta_speed
+        )
+        self.theta_speed += self.theta_acceleration * dt
+        self.theta += self.theta_speed * dt
+
+        # Cart.tick is handed the number of steps already taken in the
+        # episode, so compare before counting this one.
+        failed = (
+                (np.abs(self.position) > self.position_range)
+                | (np.abs(self.theta) > self.theta_threshold)
+        )
+        self.truncated = ~failed & (self.steps > self._max_steps)
+        self.terminated = failed | self.truncated
+        self.steps += 1
+
+        if self._auto_reset and self.terminated.any():
+            self.final_state[self.terminated] = self.get_current_state()[self.terminated]
+            terminated = self.terminated.copy()
+            truncated = self.truncated.copy()
+            self.reset(terminated)
+            self.terminated = terminated
+            self.truncated = truncated
+
+        return self.terminated
@@ -0,0 +1,65 @@
+import numpy as np
+from .scenery import Scenery
+from .vector_cart import VectorCart
+
+
+class VectorScenery:
+    # Headless counterpart of Scenery for N environments at once: same action
+    # accumulation, force and reward, with the physics done by VectorCart.
+    gravity = Scenery.gravity
+    _manual_force = Scenery._manual_force
+
+    def __init__(self, num_envs, max_steps, auto_reset=True):
+        self._cart = VectorCart(num_envs, max_steps, auto_reset)
+        self._action = np.zeros(num_envs)
+        self._max_steps = max_steps
+        self._auto_reset = auto_reset
+        self.num_envs = num_envs
+
+    def reset(self, mask=None):
+        if mask is None:
+            mask = slice(None)
+        self._action[mask] = 0.0
+        self._cart.reset(mask)
+
+    def randomize(self, mask, init_noise, rng):
+        # Perturb the state of the masked environments uniformly by up to
+        # init_noise in (position, speed, angle, angular speed).
+        count = int(np.count_nonzero(mask))
+        if count == 0 or not np.any(init_noise):
+            return
+        noise = rng.uniform(-np.asarray(init_noise), np.asarray(init_noise), (count, 4))
+        self._cart.set_state(noise, mask)
+
+    def get_current_state(self):
+        return self._cart.get_current_state()
+
+    def get_reward(self, states, terminated):
+        upright = 1 - np.abs(states[:, 2]) / self._cart.theta_threshold
+        centred = 1 - np.abs(states[:, 0]) / self._cart.position_range
+
+        reward = (0.5 * upright) + (0.5 * centred)
+        return np.where(terminated, -1.0, reward)
+
+    def _apply_action(self, directions):
+        self._action = np.clip(self._action + directions, -1, 1)
+
+    def tick(self, time):
+        terminated = self._cart.tick(
+            self._action * self._manual_force,
+            self.gravity,
+            time
+        )
+        # Auto-reset environments start their next episode without a push.
+        self._action[terminated] = 0.0
+        return terminated
+
+    def post_tick(self):
+        # States after the step; finished environments report the state they
+        # terminated in, while get_current_state() already holds their reset.
+        terminated = self._cart.terminated
+        states = self.get_current_state()
+        if self._auto_reset:
+            states[terminated] = self._cart.final_state[terminated]
+        rewards = self.get_reward(states, terminated)
+        return states, rewards, terminated, self._cart.truncated
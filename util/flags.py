@@ -2,3 +2,5 @@ TRACE = False
 RECORD = False
 SAVE_NEW_WEIGHTS = False
 PREFILL_MEMORY = False
+HEADLESS = False
+REALTIME = True
@@ -1,21 +1,55 @@
+import math
 import numpy as np
+from .noise_stream import NormalStream, BLOCK_SIZE
 
 class GaussianNoise:
-    def __init__(self, action_space, noise_decay, mu=0.0, sigma=1.0):
+    def __init__(self, action_space, noise_decay, mu=0.0, sigma=1.0, seed=None):
         self.mu = mu
         self.initial_sigma = sigma
         self.sigma = sigma
         self.decay_rate = noise_decay
         self.action_space = action_space
         self.ep_count = 0
+        self._stream = NormalStream(seed)
+        self._block = np.empty(0)
+        self._position = 0
 
-    def noise(self):
-        noise = np.random.normal(self.mu, self.sigma, self.action_space)
-        noise = np.clip(noise, -1, 1)
+    def _refill(self, count):
+        # sigma only changes between episodes, so the noise is scaled and
+        # clipped a block at a time; reset() drops the rest of the block.
+        block = self.sigma * self._stream.take(max(count, BLOCK_SIZE))
+        if self.mu:
+            block += self.mu
+        self._block = np.clip(block, -1, 1, out=block)
+        self._position = 0
+
+    def noise(self, num_envs=None):
+        size = self.action_space if num_envs is None else (num_envs, self.action_space)
+        count = size if isinstance(size, int) else math.prod(size)
+        if self._position + count > len(self._block):
+            self._refill(count)
+        noise = self._block[self._position:self._position + count].reshape(size).copy()
+        self._position += count
         return noise
 
     def reset(self):
         self.ep_count += 1
         self.sigma = self.initial_sigma * ( 1 - ( self.ep_count / self.decay_rate ) )
         self.sigma = max(self.sigma, 0.01)
+        self._position = len(self._block)
+
+    def get_state(self):
+        return {
+            "sigma": self.sigma,
+            "ep_count": self.ep_count,
+            "block": self._block[self._position:].copy(),
+            "stream": self._stream.get_state(),
+        }
+
+    def set_state(self, state):
+        self.sigma = state["sigma"]
+        self.ep_count = state["ep_count"]
+        self._block = np.array(state["block"], dtype=np.float64)
+        self._position = 0
+        self._stream.set_state(state["stream"])
 
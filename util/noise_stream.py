@@ -0,0 +1,44 @@
+import math
+import numpy as np
+
+
+BLOCK_SIZE = 4096
+
+
+class NormalStream:
+    # Standard normal samples drawn in blocks of block_size from a private
+    # np.random.Generator and handed out in slices, so that per-step noise of
+    # a few values does not pay a generator call each time. seed is anything
+    # np.random.default_rng accepts; give each worker process its own child of
+    # np.random.SeedSequence(seed).spawn(n) for independent, repeatable streams.
+    def __init__(self, seed=None, block_size=BLOCK_SIZE):
+        self._rng = np.random.default_rng(seed)
+        self._block_size = block_size
+        self._block = np.empty(0)
+        self._position = 0
+
+    def take(self, size):
+        # The result is a view into the block; scale it into a new array
+        # rather than modifying it in place.
+        count = size if isinstance(size, int) else math.prod(size)
+        if self._position + count > len(self._block):
+            rest = self._block[self._position:]
+            fresh = self._rng.standard_normal(max(self._block_size, count))
+            self._block = np.concatenate([rest, fresh])
+            self._position = 0
+        values = self._block[self._position:self._position + count]
+        self._position += count
+        return values.reshape(size)
+
+    # Generator state plus the unused part of the block, so a restored stream
+    # continues with exactly the values the original would have produced.
+    def get_state(self):
+        return {
+            "bit_generator": self._rng.bit_generator.state,
+            "block": self._block[self._position:].copy(),
+        }
+
+    def set_state(self, state):
+        self._rng.bit_generator.state = state["bit_generator"]
+        self._block = np.array(state["block"], dtype=np.float64)
+        self._position = 0
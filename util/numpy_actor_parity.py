@@ -0,0 +1,41 @@
+import numpy as np
+from ddpg.trainer import Trainer
+
+
+# Checks that the NumPy actor used for fast action selection gives the same
+# actions as the Keras actor, before and after training updates.
+# Run as: python3 -m util.numpy_actor_parity
+
+EPISODES = 20
+STATES = 1024
+
+
+def max_difference(agent, states):
+    expected = agent.actor(states.astype(np.float32)).numpy()
+    actual = agent._numpy_actor(states)
+    return np.max(np.abs(actual - expected))
+
+
+def check_parity(episodes=EPISODES, seed=0, atol=1e-5):
+    rng = np.random.default_rng(seed)
+    states = rng.uniform(-1.0, 1.0, (STATES, 4)) * [3.0, 2.0, 12.0, 50.0]
+
+    trainer = Trainer(
+        episodes=episodes, memory_size=4096, batch_size=32,
+        numpy_actor=True, numpy_actor_refresh=1
+    )
+    error = max_difference(trainer.agent, states)
+    if error > atol:
+        raise AssertionError(f"Untrained actor mismatch: max error {error}")
+
+    trainer.run()
+    error = max_difference(trainer.agent, states)
+    if error > atol:
+        raise AssertionError(f"Trained actor mismatch: max error {error}")
+
+    return True
+
+
+if __name__ == "__main__":
+    check_parity()
+    print("~~~~~ NumPy actor matches the Keras actor")
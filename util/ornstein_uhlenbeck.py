@@ -1,10 +1,11 @@
 import numpy as np
+from .noise_stream import NormalStream
 
 
 class OUNoise:
     def __init__(
             self, action_space_size, decay_period, mu=0.0, theta=0.1,
-            max_sigma=0.35, min_sigma=0.05
+            max_sigma=0.35, min_sigma=0.05, num_envs=None, seed=None
     ):
         self.mu = mu
         self.theta = theta
@@ -13,21 +14,44 @@ class OUNoise:
         self.min_sigma = min_sigma
         self.decay_period = decay_period
         self.action_dim = action_space_size
+        self.shape = action_space_size if num_envs is None else (num_envs, action_space_size)
+        self.state = None
+        self.time = None
         self.low = -0.5
         self.high = 0.5
+        self._stream = NormalStream(seed)
         self.reset()
 
-    def reset(self):
-        self.state = np.random.normal(self.mu, self.sigma, size=self.action_dim)
+    def reset(self, mask=None):
+        if mask is None or self.state is None:
+            self.state = self.mu + self.sigma * self._stream.take(self.shape)
+        else:
+            self.state[mask] = self.mu + self.sigma * self._stream.take(self.state[mask].shape)
+
+    def get_state(self):
+        return {
+            "sigma": self.sigma,
+            "time": self.time,
+            "state": np.array(self.state),
+            "stream": self._stream.get_state(),
+        }
+
+    def set_state(self, state):
+        self.sigma = state["sigma"]
+        self.time = state["time"]
+        self.state = np.array(state["state"], dtype=np.float64).reshape(self.shape)
+        self._stream.set_state(state["stream"])
 
     def evolve_state(self):
         x = self.state
-        dx = self.theta * (self.mu - x) + self.sigma * np.random.randn(self.action_dim)
+        dx = self.theta * (self.mu - x) + self.sigma * self._stream.take(np.shape(x))
         self.state = x + dx
-        self.sigma = self.max_sigma - (self.max_sigma - self.min_sigma) * min(1.0, self.time / self.decay_period)
         return self.state
 
     def get_action(self, action, time):
-        self.time = time
+        # sigma only depends on the episode, so it is recomputed when that changes.
+        if time != self.time:
+            self.time = time
+            self.sigma = self.max_sigma - (self.max_sigma - self.min_sigma) * min(1.0, time / self.decay_period)
         ou_state = self.evolve_state()
         return np.clip(action + ou_state, self.low, self.high)
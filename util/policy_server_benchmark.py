@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import multiprocessing as mp
+from ddpg.policy_server import PolicyServer, PolicyClient
+
+
+# Load test of the policy server: client processes send states over the Unix
+# socket as fast as they get answers. Prints client-side p50/p99 latency,
+# the throughput and the server's mean batch size.
+# Run as: python3 -m util.policy_server_benchmark pretrained_cartpole-model-actor.npz
+
+CLIENTS = (1, 4, 16)
+REQUESTS = 2000
+
+
+def _client(path, requests, seed):
+    rng = np.random.default_rng(seed)
+    states = rng.uniform(-1.0, 1.0, (requests, 4)).astype(np.float32)
+    latencies = np.zeros(requests)
+    with PolicyClient(path) as client:
+        for i in range(requests):
+            start = time.perf_counter()
+            client.act(states[i])
+            latencies[i] = time.perf_counter() - start
+    return latencies
+
+
+def benchmark(policy, clients, requests=REQUESTS, max_delay=0.0):
+    path = os.path.join(tempfile.mkdtemp(), "policy.sock")
+    with PolicyServer.load(policy, max_delay=max_delay).start() as server:
+        server.serve_unix(path)
+        with mp.get_context("spawn").Pool(clients) as pool:
+            start = time.perf_counter()
+            latencies = pool.starmap(_client, [(path, requests, seed) for seed in range(clients)])
+            seconds = time.perf_counter() - start
+        stats = server.stats()
+
+    latencies = np.concatenate(latencies) * 1000
+    return {
+        "p50_ms": np.percentile(latencies, 50),
+        "p99_ms": np.percentile(latencies, 99),
+        "requests_per_second": len(latencies) / seconds,
+        "mean_batch": stats["mean_batch"],
+    }
+
+
+if __name__ == "__main__":
+    for clients in CLIENTS:
+        result = benchmark(sys.argv[1], clients)
+        print(
+            f"~~~~~ {clients} clients: p50 {result['p50_ms']:.3f} ms; p99 {result['p99_ms']:.3f} ms; "
+            f"{result['requests_per_second']:.0f} requests/s; mean batch {result['mean_batch']:.1f}"
+        )
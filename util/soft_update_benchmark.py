@@ -0,0 +1,54 @@
+import time
+import tensorflow as tf
+from ddpg.ddpg import DDPG
+
+
+# Times one soft target update: the old per-variable assign loop against the
+# grouped DDPG._soft_update, both eagerly and compiled.
+# Run as: python3 -m util.soft_update_benchmark
+
+REPEATS = 500
+LAYERS = [(128, 32), (400, 300)]
+
+
+def new_agent(layers):
+    return DDPG(
+        num_inputs=4, num_outputs=1, seed=1, tau=0.01, gamma=0.97,
+        batch_size=32, memory_size=1024, noise_decay=100, my_ou=0,
+        actor_layers=list(layers), critic_layers=list(layers),
+        actor_lr=0.0002, critic_lr=0.0003
+    )
+
+
+def loop_update(agent, tau):
+    for (a, b) in zip(agent.target_actor.trainable_variables, agent.actor.trainable_variables):
+        a.assign(tau * b + (1 - tau) * a)
+    for (a, b) in zip(agent.target_critic.trainable_variables, agent.critic.trainable_variables):
+        a.assign(tau * b + (1 - tau) * a)
+
+
+def time_update(update, repeats=REPEATS):
+    update()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        update()
+    return (time.perf_counter() - start) / repeats
+
+
+def benchmark(layers):
+    agent = new_agent(layers)
+    tau = tf.constant(0.01)
+    compiled_loop = tf.function(lambda: loop_update(agent, tau))
+    compiled_fused = tf.function(lambda: agent._soft_update(tau))
+    return {
+        "loop, eager": time_update(lambda: loop_update(agent, tau)),
+        "fused, eager": time_update(lambda: agent._soft_update(tau)),
+        "loop, compiled": time_update(compiled_loop),
+        "fused, compiled": time_update(compiled_fused),
+    }
+
+
+if __name__ == "__main__":
+    for layers in LAYERS:
+        for (name, seconds) in benchmark(layers).items():
+            print(f"~~~~~ {layers} {name}: {seconds * 1e6:.1f} us/update")
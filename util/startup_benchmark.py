@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import time
+import importlib
+import subprocess
+
+
+# Measures, each in a fresh interpreter, how long importing the project takes
+# and how long the first action of a new agent takes, and checks that the
+# lazily imported modules stay unloaded. Exits with status 1 when a time
+# exceeds its budget or a lazy module was loaded, so regressions show up.
+# Run as: python3 -m util.startup_benchmark
+
+REPEATS = 3
+LAZY_MODULES = ("tf_agents", "pygame", "tkinter")
+
+# Seconds, generous enough for a slow machine.
+BUDGETS = {
+    "numpy_actor": {"import": 1.0},
+    "vector_scenery": {"import": 1.0},
+    "cartpole": {"import": 20.0},
+    "keras_action": {"construct": 10.0, "first_action": 5.0},
+    "numpy_action": {"construct": 10.0, "first_action": 0.1},
+}
+
+
+def _import(module):
+    start = time.perf_counter()
+    importlib.import_module(module)
+    return {"import": time.perf_counter() - start}
+
+
+def _first_action(numpy_actor):
+    start = time.perf_counter()
+    from ddpg.trainer import Trainer
+    imported = time.perf_counter()
+    trainer = Trainer(episodes=1, memory_size=1024, batch_size=32, numpy_actor=numpy_actor)
+    constructed = time.perf_counter()
+    trainer.agent.action(trainer.state, 0)
+    acted = time.perf_counter()
+    return {
+        "import": imported - start,
+        "construct": constructed - imported,
+        "first_action": acted - constructed,
+    }
+
+
+CASES = {
+    "numpy_actor": lambda: _import("ddpg.numpy_actor"),
+    "vector_scenery": lambda: _import("env.vector_scenery"),
+    "cartpole": lambda: _import("ddpg.cartpole"),
+    "keras_action": lambda: _first_action(False),
+    "numpy_action": lambda: _first_action(True),
+}
+
+
+def _child(case):
+    timings = CASES[case]()
+    loaded = [module for module in LAZY_MODULES if module in sys.modules]
+    print(json.dumps({"timings": timings, "loaded": loaded}))
+
+
+def measure(case):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3")
+    output = subprocess.run(
+        [sys.executable, "-c", f"from util.startup_benchmark import _child; _child({case!r})"],
+        cwd=root, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(repeats=REPEATS):
+    results = {}
+    for case in CASES:
+        runs = [measure(case) for _ in range(repeats)]
+        timings = {
+            name: sorted(run["timings"][name] for run in runs)[len(runs) // 2]
+            for name in runs[0]["timings"]
+        }
+        loaded = sorted(set(module for run in runs for module in run["loaded"]))
+        results[case] = {"timings": timings, "loaded": loaded}
+    return results
+
+
+if __name__ == "__main__":
+    failed = False
+    for (case, result) in run().items():
+        for (name, seconds) in result["timings"].items():
+            budget = BUDGETS.get(case, {}).get(name)
+            over = budget is not None and seconds > budget
+            failed |= over
+            print(f"~~~~~ {case} {name}: {seconds * 1000:.1f} ms" + (f" (over {budget} s budget)" if over else ""))
+        if result["loaded"]:
+            failed = True
+            print(f"~~~~~ {case} loaded {', '.join(result['loaded'])}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,55 @@
+import numpy as np
+from env.cart import Cart
+from env.vector_cart import VectorCart
+
+
+# Steps N scalar carts and one VectorCart with identical inputs and checks that
+# both engines agree. Run as: python3 -m util.vector_cart_parity
+
+NUM_ENVS = 64
+STEPS = 300
+MAX_STEPS = 200
+GRAVITY = 9.81
+DT = 0.02
+FORCE = 100.0
+
+
+def check_parity(num_envs=NUM_ENVS, steps=STEPS, seed=0, atol=1e-9):
+    rng = np.random.default_rng(seed)
+
+    carts = [Cart(MAX_STEPS) for _ in range(num_envs)]
+    vector_cart = VectorCart(num_envs, MAX_STEPS, auto_reset=False)
+
+    initial = rng.uniform(-0.05, 0.05, (num_envs, 4)) * [1.0, 1.0, 100.0, 100.0]
+    for cart, state in zip(carts, initial):
+        cart.position = (state[0], 0.0)
+        cart.speed, cart.theta, cart.theta_speed = state[1], state[2], state[3]
+    vector_cart.set_state(initial)
+
+    active = np.ones(num_envs, dtype=bool)
+    for step in range(steps):
+        forces = rng.uniform(-1.0, 1.0, num_envs) * FORCE
+        for i, cart in enumerate(carts):
+            if active[i]:
+                cart.tick(forces[i], GRAVITY, DT, step)
+        vector_cart.tick(forces, GRAVITY, DT)
+
+        expected = np.array([cart.get_current_state() for cart in carts])
+        actual = vector_cart.get_current_state()
+        if not np.allclose(actual[active], expected[active], rtol=0.0, atol=atol):
+            error = np.max(np.abs(actual[active] - expected[active]))
+            raise AssertionError(f"State mismatch at step {step}: max error {error}")
+
+        terminated = np.array([cart.terminated for cart in carts])
+        if not np.array_equal(vector_cart.terminated[active], terminated[active]):
+            raise AssertionError(f"Termination mismatch at step {step}")
+
+        # Scalar carts are frozen once terminated, so stop comparing them.
+        active &= ~terminated
+
+    return True
+
+
+if __name__ == "__main__":
+    check_parity()
+    print("~~~~~ VectorCart matches Cart.tick")